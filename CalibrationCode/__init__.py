@@ -2,5 +2,9 @@
 # -*- coding: utf-8 -*-
 import CalibrationCode.amsCalibration as amsCalibration     # noqa: F401
 import CalibrationCode.bmeCalibration as bmeCalibration     # noqa: F401
+import CalibrationCode.dataExport as dataExport             # noqa: F401
 import CalibrationCode.dataExtraction as dataExtraction     # noqa: F401
+import CalibrationCode.imuFusion as imuFusion               # noqa: F401
+import CalibrationCode.pipeline as pipeline                 # noqa: F401
+import CalibrationCode.seekableLog as seekableLog           # noqa: F401
 from CalibrationCode.customObjs import BME280Coefficents    # noqa: F401
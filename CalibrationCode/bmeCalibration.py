@@ -7,6 +7,7 @@ value, and returns a compensated value.
 individually.
 """
 from typing import Tuple, Union
+import numpy
 from numpy import uint32 as uint32_t
 from numpy import int32 as int32_t
 from numpy import int64 as int64_t
@@ -281,3 +282,112 @@ class CompensateBME280Native:
         elif humidity < humidityMin:
             humidity = humidityMin
         return humidity
+
+
+class CompensateBME280Array:
+    """Perform BME280 compensation on whole numpy arrays of raw values at once.
+
+    The formulas are the same as CompensateBME280Native, with the clamping done by numpy.clip
+    so that a chunk of samples is compensated without a python loop.
+
+    Args:
+        coefs (CoefsType): The Calibration Coefficents for the BME 280 as a dictionary containing elements
+            temperature, pressure, and humidity, each of which contains a list of the calibration coefficents.
+        uTemp (numpy.ndarray): The uncompensated temperature values.
+        uPres (numpy.ndarray): The uncompensated pressure values.
+        uHumid (numpy.ndarray): The uncompensated humidity values.
+
+    Attributes
+        temperature (numpy.ndarray): The compensated temperature values.
+        tFine (numpy.ndarray): The fine temperature values, used for compensating pressure and humidity.
+        pressure (numpy.ndarray): The compensated pressure values.
+        humidity (numpy.ndarray): The compensated humidity values.
+
+    """
+
+    def __init__(self, coefs: BME280Coefficents, uTemp: numpy.ndarray, uPres: numpy.ndarray,
+                 uHumid: numpy.ndarray) -> None:
+        """Initialize Instance."""  # noqa: I101
+        self.temperature: numpy.ndarray
+        self.tFine: numpy.ndarray
+        self.temperature, self.tFine = self.compensateTemp(uTemp, coefs.temperature)
+        self.pressure: numpy.ndarray = self.compensatePres(uPres, coefs.pressure, self.tFine)
+        self.humidity: numpy.ndarray = self.compensateHumid(uHumid, coefs.humidity, self.tFine)
+
+    @staticmethod
+    def compensateTemp(uTemp: numpy.ndarray, tCoefs: TempCoefsType) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Convert raw temperatures into useable values.
+
+        Args:
+            uTemp: The uncompensated temperature values
+            tCoefs: The calibration coefficents
+
+        Returns:
+            Tuple of the calibrated temperatures, and the values of tFine
+
+        """
+        uTemp = numpy.asarray(uTemp, dtype=numpy.float64)
+        var1: numpy.ndarray = (uTemp / 16384 - tCoefs[0] / 1024) * tCoefs[1]
+        var2: numpy.ndarray = uTemp / 131072 - tCoefs[0] / 8192
+        var2 = (var2 * var2) * tCoefs[2]
+        # int() in CompensateBME280Native truncates towards zero
+        tFine: numpy.ndarray = numpy.trunc(var1 + var2)
+        temperature: numpy.ndarray = numpy.clip((var1 + var2) / 5120, -40, 85)
+        return temperature, tFine
+
+    @staticmethod
+    def compensatePres(uPres: numpy.ndarray, pCoefs: PresCoefsType, tFine: numpy.ndarray) -> numpy.ndarray:
+        """Convert the raw pressure values into useable units.
+
+        Args:
+            uPres: The uncompensated Pressure Values
+            pCoefs: Tuple of pressure compensation coefficents
+            tFine: Fine temperature calculation from compensateTemp
+
+        Returns:
+            Array of the calculated pressures
+
+        """
+        pressureMin = 30000
+        pressureMax = 110000
+        uPres = numpy.asarray(uPres, dtype=numpy.float64)
+        var1: numpy.ndarray = (tFine / 2) - 64000
+        var2: numpy.ndarray = var1 * var1 * pCoefs[5] / 32768
+        var2 = var2 + var1 * pCoefs[4] * 2
+        var2 = (var2 / 4) + (pCoefs[3] * 65536)
+        var3: numpy.ndarray = pCoefs[2] * var1 * var1 / 524288
+        var1 = (var3 + pCoefs[1] + var1) / 524288
+        var1 = (1 + var1 + 32768) * pCoefs[0]
+        # Avoids a divide by zero exception for pressure
+        valid: numpy.ndarray = numpy.not_equal(var1, 0)
+        safeVar1: numpy.ndarray = numpy.where(valid, var1, 1)
+        pressure: numpy.ndarray = 1048576 - uPres
+        pressure = (pressure - (var2 / 4096)) * 6250 / safeVar1
+        var1 = (pCoefs[8]) * pressure * pressure / 2147483648
+        var2 = pressure * pCoefs[7] / 32768
+        pressure = pressure + (var1 + var2 + pCoefs[6]) / 16
+        return numpy.where(valid, numpy.clip(pressure, pressureMin, pressureMax), pressureMin)
+
+    @staticmethod
+    def compensateHumid(uHumid: numpy.ndarray, hCoefs: HumidityCoefsType, tFine: numpy.ndarray) -> numpy.ndarray:
+        """Compensates the raw humidity values, making them user readable.
+
+        Args:
+            uHumid: The uncompensated humidity values
+            hCoefs: Tuple with the compensation coefficents
+            tFine: Fine temperature values from compensateTemp
+
+        Returns:
+            Compensated humidity values
+
+        """
+        uHumid = numpy.asarray(uHumid, dtype=numpy.float64)
+        var1: numpy.ndarray = tFine - 76800
+        var2: numpy.ndarray = hCoefs[3] * 64 * (hCoefs[4] / 16384.0 * var1)
+        var3: numpy.ndarray = uHumid - var2
+        var4: float = hCoefs[1] / 65536
+        var5: numpy.ndarray = 1 + ((hCoefs[2]) / 67108864) * var1
+        var6: numpy.ndarray = 1 + ((hCoefs[5]) / 67108864) * var1 * var5
+        var6 = var3 * var4 * (var5 * var6)
+        humidity: numpy.ndarray = var6 * (1.0 - hCoefs[0] * var6 / 524288)
+        return numpy.clip(humidity, 0, 100)
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """Custom Objects for the module."""
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from os import PathLike
+from typing import Callable, Dict, Optional, Tuple, Union
 
 from numpy import int32, int64
 
@@ -19,6 +21,51 @@ class BME280Coefficents:
     ID: int
 
 
+@dataclass
+class LogFrame:
+    """Location and contents of one independently compressed frame of a seekable log."""
+
+    offset: int
+    size: int
+    firstPacket: int
+    packetCount: int
+    sensorMask: bytes
+
+    def hasSensor(self, sensorID: int) -> bool:
+        """Check if the frame might hold packets from a sensor.
+
+        Args:
+            sensorID: The ID of the sensor
+
+        Returns:
+            False if the frame has no packets from the sensor, True if it might.
+
+        """
+        if sensorID >= len(self.sensorMask) * 8:
+            return True
+        return bool(self.sensorMask[sensorID // 8] & (1 << (sensorID % 8)))
+
+
+@dataclass
+class Stage:
+    """One step of a processing pipeline, see pipeline.Pipeline.
+
+    The function is called with the outputs of the input stages (in order) as positional
+    arguments, and params as keyword arguments. Changing the version, params, or the
+    watched files of a stage invalidates its memoized output, and that of everything downstream.
+    checkOutput is called on a memoized output before it is reused, and returning False runs the
+    stage again, such as when a stage's output files have been deleted.
+    """
+
+    name: str
+    function: Callable[..., object]
+    inputs: Tuple[str, ...] = ()
+    version: int = 1
+    params: Dict[str, object] = field(default_factory=dict)
+    watchFiles: Tuple[Union[str, PathLike], ...] = ()
+    checkOutput: Optional[Callable[[object], bool]] = None
+
+
 @dataclass
 class _BME280TemperatureCoefficents():
     """Named Tuple for all of the temperatre calibration coefficents on the BME280."""
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Export decoded and compensated EAS log data to files.
+
+The exporters take the packet batches produced by dataExtraction.openFileStreaming
+(or iterPacketBatches), so only one chunk of the log is ever held in memory. Every
+batch is split up by sensor, and each sensor gets its own output file holding the
+packet index, the raw values, and for BME280s with known calibration coefficents, the
+compensated values.
+
+Two formats are supported:
+    CSVExporter writes one CSV file per sensor, formatting a whole chunk at a time.
+    ColumnarExporter writes one binary columnar file per sensor, which can be read
+    back with readColumnar.
+"""
+import json
+import os
+import struct
+from abc import ABC, abstractmethod
+from pathlib import Path
+from types import TracebackType
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+
+import numpy
+
+from CalibrationCode.bmeCalibration import CompensateBME280Array
+from CalibrationCode.dataExtraction import BME280CalType
+from CalibrationCode.typeAliases import PacketBatchType
+
+defaultBufferSize = 1 << 20
+defaultCSVPrecision = 6
+columnarMagic = b'EASCOL\x01\n'
+columnarSuffix = '.eascol'
+
+ColumnsType = Dict[str, numpy.ndarray]
+SensorKeyType = Tuple[int, int]
+CompensatedType = Dict[int, CompensateBME280Array]
+
+
+def sensorColumns(batch: PacketBatchType, calibrations: Optional[BME280CalType] = None,
+                  compensated: Optional[CompensatedType] = None) -> Iterator[Tuple[SensorKeyType, ColumnsType]]:
+    """Split a packet batch up into the columns for each sensor.
+
+    Args:
+        batch: A decoded packet batch, see dataExtraction.decodePacketChunk
+        calibrations: Calibration coefficents for the BME280s, used to add compensated columns
+        compensated: Already compensated values for the BME280s in this batch, by sensor ID, with one
+            value per packet of that sensor. These are used as is, rather than compensating again.
+
+    Yields:
+        The (sensor ID, packet type) of each sensor in the batch, and its columns. The ID and
+        type columns are dropped as they are constant for a sensor.
+
+    Raises:
+        ValueError: The compensated values of a sensor do not have one value per packet in the batch
+
+    """
+    for packetType, packets in batch.items():
+        for sensorID in numpy.unique(packets['ID']).tolist():
+            rows: numpy.ndarray = packets[packets['ID'] == sensorID]
+            columns: ColumnsType = {name: rows[name] for name in packets.dtype.names or ()
+                                    if name not in ('ID', 'type')}
+            values: Optional[CompensateBME280Array] = None
+            if packetType == 0x0a and compensated and sensorID in compensated:
+                values = compensated[sensorID]
+            elif packetType == 0x0a and calibrations and sensorID in calibrations:
+                values = CompensateBME280Array(calibrations[sensorID], rows['uTemp'], rows['uPres'], rows['uHumid'])
+            if values is not None:
+                for name in ('temperature', 'pressure', 'humidity'):
+                    if len(getattr(values, name)) != len(rows):
+                        raise ValueError('Sensor ' + str(sensorID) + ' has ' + str(len(rows))
+                                         + ' packets in the batch, but ' + str(len(getattr(values, name)))
+                                         + ' compensated ' + name + ' values')
+                columns['temperature'] = values.temperature
+                columns['pressure'] = values.pressure
+                columns['humidity'] = values.humidity
+            yield (sensorID, packetType), columns
+
+
+class _SensorExporter(ABC):
+    """Common handling for exporters that write one file per sensor.
+
+    Args:
+        outDir: The directory to write the files to, created if it does not exist.
+        calibrations: Calibration coefficents for the BME280s, see dataExtraction.extractPresCalCoefs.
+
+    """
+
+    suffix: str = ''
+
+    def __init__(self, outDir: Union[str, os.PathLike], calibrations: Optional[BME280CalType] = None) -> None:
+        """Initialize Instance."""  # noqa: I101
+        self.outDir: Path = Path(outDir)
+        self.outDir.mkdir(parents=True, exist_ok=True)
+        self.calibrations: Optional[BME280CalType] = calibrations
+
+    def sensorPath(self, key: SensorKeyType) -> Path:
+        """Get the path of the file for a sensor.
+
+        Args:
+            key: The (sensor ID, packet type) of the sensor
+
+        Returns:
+            Path of the output file
+
+        """
+        return self.outDir / ('sensor' + str(key[0]) + '_type' + format(key[1], '02x') + self.suffix)
+
+    def write(self, batch: PacketBatchType, compensated: Optional[CompensatedType] = None) -> None:
+        """Write one packet batch to the output files.
+
+        Args:
+            batch: A decoded packet batch
+            compensated: Already compensated BME280 values for this batch, see sensorColumns
+
+        """
+        for key, columns in sensorColumns(batch, self.calibrations, compensated):
+            self._writeColumns(key, columns)
+
+    def writeBatches(self, batches: Iterable[PacketBatchType]) -> None:
+        """Write every packet batch from an iterable, such as the one returned by openFileStreaming.
+
+        Args:
+            batches: The decoded packet batches
+
+        """
+        for batch in batches:
+            self.write(batch)
+
+    @abstractmethod
+    def _writeColumns(self, key: SensorKeyType, columns: ColumnsType) -> None:
+        """Append the columns of one sensor to its output file."""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Flush and close all of the output files."""
+
+    def __enter__(self) -> '_SensorExporter':
+        """Use the exporter as a context manager."""
+        return self
+
+    def __exit__(self, excType: Optional[Type[BaseException]], excValue: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        """Close the output files when leaving the context."""
+        self.close()
+
+
+class CSVExporter(_SensorExporter):
+    """Write packet batches to one CSV file per sensor.
+
+    Each chunk is formatted in bulk by formatCSVRows and handed to a large write buffer, rather
+    than writing the file a row at a time. Floats are written with a fixed number of decimal places.
+
+    Args:
+        bufferSize (int): The size of the write buffer of each file.
+        precision (int): The number of decimal places to write floats with.
+
+    """
+
+    suffix = '.csv'
+
+    def __init__(self, outDir: Union[str, os.PathLike], calibrations: Optional[BME280CalType] = None,
+                 bufferSize: int = defaultBufferSize, precision: int = defaultCSVPrecision) -> None:
+        """Initialize Instance."""  # noqa: I101
+        super().__init__(outDir, calibrations)
+        self.bufferSize: int = bufferSize
+        self.precision: int = precision
+        self._files: Dict[SensorKeyType, BinaryIO] = {}
+
+    def _writeColumns(self, key: SensorKeyType, columns: ColumnsType) -> None:
+        fileObj: Optional[BinaryIO] = self._files.get(key)
+        if fileObj is None:
+            fileObj = open(self.sensorPath(key), mode='wb',  # pylint: disable=consider-using-with
+                           buffering=self.bufferSize)
+            fileObj.write((','.join(columns) + '\n').encode('ascii'))
+            self._files[key] = fileObj
+        fileObj.write(formatCSVRows(columns.values(), self.precision))
+
+    def close(self) -> None:
+        """Flush and close all of the output files."""
+        for fileObj in self._files.values():
+            fileObj.close()
+        self._files.clear()
+
+
+def formatCSVRows(columns: Iterable[numpy.ndarray], precision: int = defaultCSVPrecision) -> bytes:
+    """Format columns into CSV rows in one go.
+
+    Every column is turned into ASCII characters with numpy arithmetic, as a matrix with one
+    column per sample and unused positions left as zero bytes. The matrices are stacked with the
+    separators, transposed into rows, and dropping the zero bytes leaves the CSV text, without
+    formatting any value in python.
+
+    Args:
+        columns: Equal length arrays, one per column
+        precision: The number of decimal places to write floats with
+
+    Returns:
+        The ASCII encoded CSV rows, each terminated by a newline
+
+    """
+    pieces: List[numpy.ndarray] = []
+    for column in columns:
+        if pieces:
+            pieces.append(numpy.full((1, len(column)), ord(','), dtype=numpy.uint8))
+        pieces.append(_formatColumn(column, precision))
+    if not pieces or not pieces[0].shape[1]:
+        return b''
+    pieces.append(numpy.full((1, pieces[0].shape[1]), ord('\n'), dtype=numpy.uint8))
+    # bytes.translate deletes the padding faster than a numpy boolean mask
+    return numpy.concatenate(pieces).T.tobytes().translate(None, b'\x00')
+
+
+def _formatColumn(column: numpy.ndarray, precision: int) -> numpy.ndarray:
+    """Format one column into a character matrix, with one column per sample, see formatCSVRows."""
+    if column.dtype.kind in 'iu':
+        # Going through int64 first keeps the magnitude of the most negative int64 intact
+        magnitude: numpy.ndarray = numpy.abs(column.astype(numpy.int64)).astype(numpy.uint64) \
+            if column.dtype.kind == 'i' else column
+        return _signed(column < 0, _digits(magnitude, _digitCount(magnitude)))
+    scale: int = 10 ** precision
+    if column.dtype.kind == 'f' and len(column) and numpy.isfinite(column).all() \
+            and numpy.abs(column).max() * scale < 2 ** 53:
+        scaled: numpy.ndarray = numpy.rint(numpy.abs(column) * scale).astype(numpy.uint64)
+        whole: numpy.ndarray = scaled // numpy.uint64(scale)
+        pieces: List[numpy.ndarray] = [_digits(whole, _digitCount(whole))]
+        if precision:
+            pieces.append(numpy.full((1, len(column)), ord('.'), dtype=numpy.uint8))
+            pieces.append(_digits(scaled % numpy.uint64(scale), precision, zeroPadded=True))
+        # Values that round to zero are written without a sign
+        return _signed((column < 0) & (scaled > 0), numpy.concatenate(pieces))
+    # Anything else (nan, inf, huge floats, other types) goes through numpy's own string conversion
+    text: numpy.ndarray = column.astype(str).astype(numpy.bytes_)
+    return text.view(numpy.uint8).reshape(len(column), text.dtype.itemsize).T
+
+
+def _digitCount(magnitude: numpy.ndarray) -> int:
+    """Get the number of digits needed for the largest value."""
+    return len(str(int(magnitude.max()))) if len(magnitude) else 1
+
+
+def _digits(magnitude: numpy.ndarray, width: int, zeroPadded: bool = False) -> numpy.ndarray:
+    """Write unsigned integers as right aligned ASCII digits, blanking leading zeros unless zeroPadded."""
+    # Dividing by a scalar is much faster than by an array of powers of ten, and narrower types are faster still
+    remainder: numpy.ndarray = magnitude.astype(numpy.uint32 if width < 10 else numpy.uint64)
+    characters: numpy.ndarray = numpy.empty((width, len(magnitude)), dtype=numpy.uint8)
+    for position in range(width - 1, -1, -1):
+        quotient: numpy.ndarray = remainder // 10
+        numpy.subtract(remainder, quotient * 10, out=characters[position], casting='unsafe')
+        remainder = quotient
+    characters += ord('0')
+    if not zeroPadded:
+        for position in range(width - 1):
+            characters[position][magnitude < 10 ** (width - 1 - position)] = 0
+    return characters
+
+
+def _signed(negative: numpy.ndarray, characters: numpy.ndarray) -> numpy.ndarray:
+    """Put a minus sign in front of the negative samples of a character matrix."""
+    if not negative.any():
+        return characters
+    sign: numpy.ndarray = numpy.where(negative, ord('-'), 0).astype(numpy.uint8)[None, :]
+    return numpy.concatenate((sign, characters))
+
+
+class ColumnarExporter(_SensorExporter):
+    """Write packet batches to one binary columnar file per sensor.
+
+    The file starts with columnarMagic, a little endian uint32 length, and a JSON schema listing
+    the name and numpy dtype of each column. It is followed by one block per chunk: a little
+    endian uint64 row count, then each column's values back to back. Every block is written with
+    a single writev call where the platform has one.
+    """
+
+    suffix = columnarSuffix
+
+    def __init__(self, outDir: Union[str, os.PathLike], calibrations: Optional[BME280CalType] = None) -> None:
+        """Initialize Instance."""  # noqa: I101
+        super().__init__(outDir, calibrations)
+        self._files: Dict[SensorKeyType, BinaryIO] = {}
+
+    def _writeColumns(self, key: SensorKeyType, columns: ColumnsType) -> None:
+        fileObj: Optional[BinaryIO] = self._files.get(key)
+        if fileObj is None:
+            # Unbuffered, as each block already goes out in one large write
+            fileObj = open(self.sensorPath(key), mode='wb', buffering=0)  # pylint: disable=consider-using-with
+            schema: bytes = json.dumps({'columns': [[name, column.dtype.str]
+                                                    for name, column in columns.items()]}).encode('utf-8')
+            _writeAll(fileObj, [columnarMagic, struct.pack('<I', len(schema)), schema])
+            self._files[key] = fileObj
+        rowCount: int = len(next(iter(columns.values())))
+        buffers: List[bytes] = [struct.pack('<Q', rowCount)]
+        buffers.extend(numpy.ascontiguousarray(column).tobytes() for column in columns.values())
+        _writeAll(fileObj, buffers)
+
+    def close(self) -> None:
+        """Close all of the output files."""
+        for fileObj in self._files.values():
+            fileObj.close()
+        self._files.clear()
+
+
+def _writeAll(fileObj: BinaryIO, buffers: List[bytes]) -> None:
+    """Write all buffers to an unbuffered file, with one writev call if possible."""
+    if hasattr(os, 'writev'):
+        written: int = os.writev(fileObj.fileno(), buffers)
+        if written == sum(len(buffer) for buffer in buffers):
+            return
+        # Partial write, finish off the remainder the slow way
+        remainder: memoryview = memoryview(b''.join(buffers))[written:]
+    else:
+        remainder = memoryview(b''.join(buffers))
+    while remainder:
+        remainder = remainder[fileObj.write(remainder):]
+
+
+def readColumnar(filePath: Union[str, os.PathLike]) -> ColumnsType:
+    """Read a file written by ColumnarExporter.
+
+    Args:
+        filePath: The path to the columnar file
+
+    Returns:
+        Dictionary mapping each column name to an array of all its values
+
+    Raises:
+        ValueError: The file is not a columnar export
+
+    """
+    with open(filePath, mode='rb') as fileObj:
+        if fileObj.read(len(columnarMagic)) != columnarMagic:
+            raise ValueError(str(filePath) + ' is not an EAS columnar file')
+        schemaLength: int = struct.unpack('<I', fileObj.read(4))[0]
+        schema: List[Tuple[str, numpy.dtype]] = [(name, numpy.dtype(dtype)) for name, dtype in
+                                                 json.loads(fileObj.read(schemaLength).decode('utf-8'))['columns']]
+        blocks: Dict[str, List[numpy.ndarray]] = {name: [] for name, _ in schema}
+        blockHeader: bytes = fileObj.read(8)
+        while blockHeader:
+            rowCount: int = struct.unpack('<Q', blockHeader)[0]
+            for name, dtype in schema:
+                blocks[name].append(numpy.frombuffer(fileObj.read(rowCount * dtype.itemsize), dtype=dtype))
+            blockHeader = fileObj.read(8)
+    return {name: numpy.concatenate(blocks[name]) if blocks[name] else numpy.empty(0, dtype=dtype)
+            for name, dtype in schema}
@@ -10,17 +10,106 @@ or graphing).
 # INFO: Each DAQpack is 24 bytes long
 
 import binascii
+import bz2
+import gzip
+import lzma
 import struct
 from os import PathLike
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename
-from typing import BinaryIO, List, Tuple, Union, Dict
+from types import ModuleType, TracebackType
+from typing import BinaryIO, List, Tuple, Union, Dict, Iterator, Optional, Type, cast
 
-from CalibrationCode.typeAliases import UCompDataType
+import numpy
+
+from CalibrationCode.typeAliases import UCompDataType, PacketBatchType
 from CalibrationCode.customObjs import BME280Coefficents
 
+# zstd support is optional, as zstandard is not part of the standard library
+zstandard: Optional[ModuleType]
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 BME280CalType = Dict[Union[str, int], BME280Coefficents]
 
+headerSize = 0x400
+packetSize = 24
+defaultChunkPackets = 1 << 16
+
+
+def _packetDtype(names: Tuple[str, ...], formats: Tuple[str, ...], offsets: Tuple[int, ...]) -> numpy.dtype:
+    """Build a structured dtype that views a whole 24 byte packet."""
+    return numpy.dtype({'names': list(names), 'formats': list(formats),
+                        'offsets': list(offsets), 'itemsize': packetSize})
+
+
+# Structured equivalents of the struct formats used in processPackets, keyed by packet type.
+packetDtypes: Dict[int, numpy.dtype] = {
+    0x02: _packetDtype(('ID', 'type', 'uAccX', 'uAccY', 'uAccZ'),
+                       ('<u4', '<u4', '<i2', '<i2', '<i2'),
+                       (0, 4, 8, 10, 12)),
+    0x03: _packetDtype(('ID', 'type', 'uPres', 'uTemp'),
+                       ('<u4', '<u4', '<u4', '<u2'),
+                       (0, 4, 8, 12)),
+    0x07: _packetDtype(('ID', 'type', 'uAccX', 'uAccY', 'uAccZ', 'uGyroX', 'uGyroY', 'uGyroZ', 'uTemp'),
+                       ('<u4', '<u4', '<i2', '<i2', '<i2', '<i2', '<i2', '<i2', '<i2'),
+                       (0, 4, 8, 10, 12, 14, 16, 18, 20)),
+    0x0a: _packetDtype(('ID', 'type', 'uPres', 'uTemp', 'uHumid'),
+                       ('<u4', '<u4', '<u4', '<u4', '<u2'),
+                       (0, 4, 8, 12, 16)),
+    # processPackets only keeps the first byte of the ID for HSCpress packets
+    0x0b: _packetDtype(('ID', 'type'),
+                       ('u1', '<u4'),
+                       (0, 4)),
+}
+_packetTypeDtype = _packetDtype(('type',), ('<u4',), (4,))
+# The packed form of each packet type, with the index of the packet in the log in front
+_decodedDtypes: Dict[int, numpy.dtype] = {
+    packetType: numpy.dtype([('index', '<i8')] + [(name, dtype[name].str) for name in dtype.names or ()])
+    for packetType, dtype in packetDtypes.items()}
+
+gzipMagic = b'\x1f\x8b'
+bzip2Magic = b'BZh'
+xzMagic = b'\xfd7zXZ\x00'
+zstdMagic = b'\x28\xb5\x2f\xfd'
+
+
+def openLogFile(filePath: Union[str, PathLike]) -> BinaryIO:
+    """Open a log file for reading, decompressing it on the fly if needed.
+
+    The compression is detected from the magic bytes at the start of the file, so gzip, bzip2
+    and xz logs work regardless of their file extension. zstd logs need the zstandard package.
+
+    Args:
+        filePath: The path to the (possibly compressed) log file
+
+    Returns:
+        A binary file object that reads the uncompressed log
+
+    Raises:
+        ImportError: The file is zstd compressed and zstandard is not installed
+
+    """
+    with open(filePath, mode='rb') as fileObj:
+        magic: bytes = fileObj.read(len(xzMagic))
+    # The decompressors are not typing.BinaryIO subclasses, but have the read interface used here
+    if magic.startswith(gzipMagic):
+        return cast(BinaryIO, gzip.open(filePath, mode='rb'))
+    if magic.startswith(bzip2Magic):
+        return cast(BinaryIO, bz2.open(filePath, mode='rb'))
+    if magic.startswith(xzMagic):
+        return cast(BinaryIO, lzma.open(filePath, mode='rb'))
+    if magic.startswith(zstdMagic):
+        if zstandard is None:
+            raise ImportError(str(filePath) + ' is zstd compressed, which needs the zstandard package')
+        compressedObj: BinaryIO = open(filePath, mode='rb')    # pylint: disable=consider-using-with
+        # Older zstandard releases stop after the first frame by default, which truncates multi-frame logs
+        return cast(BinaryIO, zstandard.ZstdDecompressor().stream_reader(compressedObj, closefd=True,
+                                                                         read_across_frames=True))
+    return open(filePath, mode='rb')
+
 
 def openFileInteractive() -> Tuple[List[List[str]], bytes]:
     """Open a tkinter file dialog to prompt the user to select a file, then parse the file.
@@ -32,8 +121,11 @@ def openFileInteractive() -> Tuple[List[List[str]], bytes]:
     data: bytes
     fileObj: BinaryIO
     Tk().withdraw()
-    fileName = askopenfilename(title='Select File to Open', filetypes=(('Log File', '*.log'), ('All File Types', '*')))
-    with open(fileName, mode='rb') as fileObj:
+    fileName = askopenfilename(title='Select File to Open',
+                               filetypes=(('Log File', '*.log'),
+                                          ('Compressed Log File', '*.log.gz *.log.bz2 *.log.xz *.log.zst'),
+                                          ('All File Types', '*')))
+    with openLogFile(fileName) as fileObj:
         data = fileObj.read()
 
     # Each DAQpack is 24 bytes long
@@ -49,18 +141,101 @@ def openFileNonInteractive(filePath: Union[str, PathLike]) -> Tuple[List[List[st
     """Open and split up the given log file.
 
     Args:
-        filePath: The path to the log file
+        filePath: The path to the log file, which may be compressed (see openLogFile)
 
     Returns:
         The header (split into section for each device), and the raw bytes from the data.
 
     """
-    with open(filePath, mode='rb') as fileObj:
+    with openLogFile(filePath) as fileObj:
         data = fileObj.read()
 
     return splitBytesFile(data)
 
 
+def openFileStreaming(filePath: Union[str, PathLike],
+                      chunkPackets: int = defaultChunkPackets) -> Tuple[List[List[str]], 'PacketBatchStream']:
+    """Open the given log file, reading the header now and the packets lazily in chunks.
+
+    Compressed logs are decompressed as a stream, so the whole uncompressed log is never held in memory.
+
+    Args:
+        filePath: The path to the log file, which may be compressed (see openLogFile)
+        chunkPackets: The number of packets to decode per batch
+
+    Returns:
+        The header (split into section for each device), and an iterator over the decoded packet batches.
+        See PacketBatchStream for when the file is closed.
+
+    """
+    header, fileObj = openLogHeader(filePath)
+    return header, PacketBatchStream(fileObj, iterPacketBatches(fileObj, chunkPackets))
+
+
+def openLogHeader(filePath: Union[str, PathLike]) -> Tuple[List[List[str]], BinaryIO]:
+    """Open the given log file and read its header, leaving the file at the first packet.
+
+    Args:
+        filePath: The path to the log file, which may be compressed (see openLogFile)
+
+    Returns:
+        The header (split into section for each device), and the open file for the caller to close.
+        The file is closed here if the header can not be read.
+
+    """
+    fileObj: BinaryIO = openLogFile(filePath)
+    try:
+        header, _ = splitBytesFile(readFully(fileObj, headerSize))
+    except BaseException:
+        fileObj.close()
+        raise
+    return header, fileObj
+
+
+class PacketBatchStream(Iterator[PacketBatchType]):
+    """Iterator over packet batches that owns the file they are read from.
+
+    The file is closed once the batches run out, when close is called, when leaving a with
+    block on the stream, or when a stream that was dropped part way through is garbage collected.
+
+    Args:
+        fileObj (BinaryIO): The open file the batches are read from.
+        batches (Iterator[PacketBatchType]): The batches, see iterPacketBatches.
+
+    """
+
+    def __init__(self, fileObj: BinaryIO, batches: Iterator[PacketBatchType]) -> None:
+        """Initialize Instance."""  # noqa: I101
+        self._fileObj: BinaryIO = fileObj
+        self._batches: Iterator[PacketBatchType] = batches
+
+    def __next__(self) -> PacketBatchType:
+        """Get the next batch, closing the file after the last one."""
+        try:
+            return next(self._batches)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """Close the file, ending the stream."""
+        self._batches = iter(())
+        self._fileObj.close()
+
+    def __enter__(self) -> 'PacketBatchStream':
+        """Use the stream as a context manager."""
+        return self
+
+    def __exit__(self, excType: Optional[Type[BaseException]], excValue: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        """Close the file when leaving the context."""
+        self.close()
+
+    def __del__(self) -> None:
+        """Close the file if the stream is dropped before it is used up."""
+        self.close()
+
+
 def splitBytesFile(bytesFile: bytes) -> Tuple[List[List[str]], bytes]:
     """Split up the raw data from a log file into the header and rawData.
 
@@ -75,8 +250,8 @@ def splitBytesFile(bytesFile: bytes) -> Tuple[List[List[str]], bytes]:
     # Split the file up into the header and raw data.
     # THIS needs tweaking, some log files will have a larger header,
     # but data always begins at a multilpe of 0x400
-    header: List[List[str]] = [out.splitlines() for out in bytesFile[:0x400].decode('utf-8').split('-----')]
-    rawData: bytes = bytesFile[0x400:]
+    header: List[List[str]] = [out.splitlines() for out in bytesFile[:headerSize].decode('utf-8').split('-----')]
+    rawData: bytes = bytesFile[headerSize:]
     return header, rawData
 
 
@@ -139,6 +314,100 @@ def splitSensorData(dataStream: bytes) -> List[bytes]:
     return splitData
 
 
+def iterPacketChunks(fileObj: BinaryIO, chunkPackets: int = defaultChunkPackets) -> Iterator[bytes]:
+    """Read the packet region of a log file in chunks made of whole packets.
+
+    Args:
+        fileObj: A binary file object positioned at the start of the packet region
+        chunkPackets: The number of packets to read per chunk
+
+    Yields:
+        Byte strings whose length is a multiple of the packet size. Like splitSensorData,
+        a trailing partial packet is dropped.
+
+    """
+    chunkSize: int = chunkPackets * packetSize
+    while True:
+        data: bytes = readFully(fileObj, chunkSize)
+        whole: int = len(data) - len(data) % packetSize
+        if whole:
+            yield data[:whole]
+        if len(data) < chunkSize:
+            return
+
+
+def readFully(fileObj: BinaryIO, size: int) -> bytes:
+    """Read size bytes, or up to the end of the file.
+
+    Streams (pipes, decompressors) can return short reads, so keep reading until done.
+
+    Args:
+        fileObj: The binary file object to read from
+        size: The number of bytes to read
+
+    Returns:
+        The bytes read, only shorter than size at the end of the file
+
+    """
+    pieces: List[bytes] = []
+    remaining: int = size
+    while remaining > 0:
+        piece: bytes = fileObj.read(remaining)
+        if not piece:
+            break
+        pieces.append(piece)
+        remaining -= len(piece)
+    return b''.join(pieces)
+
+
+def decodePacketChunk(chunk: bytes, firstIndex: int = 0) -> PacketBatchType:
+    """Decode a chunk of packets into one structured numpy array per packet type.
+
+    This is the vectorized equivalent of processPackets; packet types that processPackets
+    skips are skipped here as well.
+
+    Args:
+        chunk: Raw packet bytes, a whole number of packets long
+        firstIndex: The index of the first packet of the chunk within the whole log
+
+    Returns:
+        Dictionary mapping the packet type to an array holding an 'index' field (the position of
+        the packet in the log) followed by the same fields processPackets would produce.
+
+    """
+    count: int = len(chunk) // packetSize
+    packetTypes: numpy.ndarray = numpy.frombuffer(chunk, dtype=_packetTypeDtype, count=count)['type']
+    batch: PacketBatchType = {}
+    for packetType, dtype in packetDtypes.items():
+        rows: numpy.ndarray = numpy.flatnonzero(packetTypes == packetType)
+        if not rows.size:
+            continue
+        packets: numpy.ndarray = numpy.frombuffer(chunk, dtype=dtype, count=count)[rows]
+        decoded: numpy.ndarray = numpy.empty(rows.size, dtype=_decodedDtypes[packetType])
+        decoded['index'] = rows + firstIndex
+        for name in dtype.names or ():
+            decoded[name] = packets[name]
+        batch[packetType] = decoded
+    return batch
+
+
+def iterPacketBatches(fileObj: BinaryIO, chunkPackets: int = defaultChunkPackets) -> Iterator[PacketBatchType]:
+    """Decode the packet region of a log file in bounded memory.
+
+    Args:
+        fileObj: A binary file object positioned at the start of the packet region
+        chunkPackets: The number of packets to decode per batch
+
+    Yields:
+        The decoded batch for each chunk, see decodePacketChunk
+
+    """
+    firstIndex: int = 0
+    for chunk in iterPacketChunks(fileObj, chunkPackets):
+        yield decodePacketChunk(chunk, firstIndex)
+        firstIndex += len(chunk) // packetSize
+
+
 def processPackets(packets: List[bytes]) -> UCompDataType:
     # pylint: disable=too-complex, too-many-branches
     """Extract variables from the packets using the struct module.
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Estimate attitude and dead-reckoned motion from the IMU (packet type 0x07).
+
+Roll and pitch come from a complementary filter, which blends the integrated gyro rates
+with the tilt seen by the accelerometer. Yaw is the integrated gyro rate only, as there
+is no magnetometer. The accelerometer is then rotated into the world frame (z up) and,
+once gravity is removed, integrated twice for velocity and position.
+
+The filter is a linear recurrence, so each chunk is solved in closed form with numpy
+rather than a python loop per sample. The filter state is kept between calls, so the
+chunks from dataExtraction.openFileStreaming can be fed in one after the other.
+"""
+import math
+from typing import Dict, Iterable, Iterator, Optional
+
+import numpy
+
+from CalibrationCode.typeAliases import PacketBatchType
+
+imuPacketType = 0x07
+standardGravity = 9.80665
+# MPU-6050 style defaults, for the +-2 g and +-250 deg/s ranges
+defaultAccelScale = 16384.0
+defaultGyroScale = 131.0
+
+attitudeDtype = numpy.dtype([('index', '<i8'),
+                             ('qW', '<f8'), ('qX', '<f8'), ('qY', '<f8'), ('qZ', '<f8'),
+                             ('roll', '<f8'), ('pitch', '<f8'), ('yaw', '<f8'),
+                             ('velX', '<f8'), ('velY', '<f8'), ('velZ', '<f8'),
+                             ('posX', '<f8'), ('posY', '<f8'), ('posZ', '<f8')])
+
+
+class IMUFusion:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """Complementary filter and dead reckoning for one IMU, fed a chunk at a time.
+
+    Args:
+        samplePeriod (float): The time between IMU samples, in seconds.
+        alpha (float): Weight of the gyro in the complementary filter, from 0 (accelerometer only)
+            up to, but not including, 1.
+        accelScale (float): Raw accelerometer counts per g.
+        gyroScale (float): Raw gyro counts per degree per second.
+
+    Attributes
+        attitude (numpy.ndarray): The current roll, pitch and yaw, in radians. Roll is kept in (-pi, pi].
+        velocity (numpy.ndarray): The current world frame velocity, in m/s.
+        position (numpy.ndarray): The current world frame position relative to the start, in m.
+
+    Raises:
+        ValueError: alpha is outside of [0, 1)
+
+    """
+
+    def __init__(self, samplePeriod: float, alpha: float = 0.98, accelScale: float = defaultAccelScale,
+                 gyroScale: float = defaultGyroScale) -> None:
+        """Initialize Instance."""  # noqa: I101
+        if not 0 <= alpha < 1:
+            raise ValueError('alpha must be in [0, 1), got ' + str(alpha))
+        self.samplePeriod: float = samplePeriod
+        self.alpha: float = alpha
+        self.accelScale: float = accelScale
+        self.gyroScale: float = gyroScale
+        self.attitude: Optional[numpy.ndarray] = None
+        self._accelRoll: float = 0.0
+        self.velocity: numpy.ndarray = numpy.zeros(3)
+        self.position: numpy.ndarray = numpy.zeros(3)
+
+    def update(self, packets: numpy.ndarray) -> numpy.ndarray:
+        """Run the filter over the next chunk of IMU samples.
+
+        Args:
+            packets: Decoded type 0x07 packets for this IMU, in sample order (see dataExtraction.decodePacketChunk)
+
+        Returns:
+            Array with attitudeDtype, one row per sample, carrying over the index of each packet.
+
+        """
+        result: numpy.ndarray = numpy.empty(len(packets), dtype=attitudeDtype)
+        result['index'] = packets['index']
+        if not packets.size:
+            return result
+        accel: numpy.ndarray = numpy.column_stack((packets['uAccX'], packets['uAccY'],
+                                                   packets['uAccZ'])) * (standardGravity / self.accelScale)
+        gyro: numpy.ndarray = numpy.column_stack((packets['uGyroX'], packets['uGyroY'],
+                                                  packets['uGyroZ'])) * (math.radians(1) / self.gyroScale)
+
+        accelTilt: numpy.ndarray = numpy.column_stack(
+            (numpy.arctan2(accel[:, 1], accel[:, 2]),
+             numpy.arctan2(-accel[:, 0], numpy.hypot(accel[:, 1], accel[:, 2]))))
+        if self.attitude is None:
+            # Start level with the first accelerometer reading, rather than waiting for the filter to settle
+            self.attitude = numpy.array([accelTilt[0, 0], accelTilt[0, 1], 0.0])
+            self._accelRoll = accelTilt[0, 0]
+
+        # arctan2 wraps roll at +-pi, and blending the wrapped angle would pull an inverted IMU
+        # through level, so make the accelerometer roll carry on from the previous sample
+        accelTilt[:, 0] = numpy.unwrap(numpy.concatenate(([self._accelRoll], accelTilt[:, 0])))[1:]
+
+        attitude: numpy.ndarray = numpy.empty((len(packets), 3))
+        attitude[:, :2] = exponentialFilter(self.alpha * self.samplePeriod * gyro[:, :2]
+                                            + (1 - self.alpha) * accelTilt, self.alpha, self.attitude[:2])
+        attitude[:, 2] = self.attitude[2] + numpy.cumsum(gyro[:, 2]) * self.samplePeriod
+        # Report roll in (-pi, pi], moving the accelerometer roll by the same whole turns
+        wrappedRoll = math.pi - numpy.mod(math.pi - attitude[:, 0], 2 * math.pi)
+        self._accelRoll = accelTilt[-1, 0] - (attitude[-1, 0] - wrappedRoll[-1])
+        attitude[:, 0] = wrappedRoll
+        self.attitude = attitude[-1].copy()
+
+        quaternion: numpy.ndarray = eulerToQuaternion(attitude)
+        for column, name in enumerate(('qW', 'qX', 'qY', 'qZ')):
+            result[name] = quaternion[:, column]
+        for column, name in enumerate(('roll', 'pitch', 'yaw')):
+            result[name] = attitude[:, column]
+
+        # Rotate the specific force into the world frame and remove gravity
+        worldAccel: numpy.ndarray = rotateByQuaternion(quaternion, accel)
+        worldAccel[:, 2] -= standardGravity
+        velocity: numpy.ndarray = self.velocity + numpy.cumsum(worldAccel, axis=0) * self.samplePeriod
+        position: numpy.ndarray = self.position + numpy.cumsum(velocity, axis=0) * self.samplePeriod
+        self.velocity = velocity[-1].copy()
+        self.position = position[-1].copy()
+        for column, axis in enumerate('XYZ'):
+            result['vel' + axis] = velocity[:, column]
+            result['pos' + axis] = position[:, column]
+        return result
+
+
+def fuseIMUBatches(batches: Iterable[PacketBatchType], samplePeriod: float, alpha: float = 0.98,
+                   accelScale: float = defaultAccelScale,
+                   gyroScale: float = defaultGyroScale) -> Iterator[Dict[int, numpy.ndarray]]:
+    """Run a separate IMUFusion filter for every IMU in a stream of packet batches.
+
+    Args:
+        batches: Decoded packet batches, such as the ones from dataExtraction.openFileStreaming
+        samplePeriod: The time between IMU samples, in seconds
+        alpha: Weight of the gyro in the complementary filter
+        accelScale: Raw accelerometer counts per g
+        gyroScale: Raw gyro counts per degree per second
+
+    Yields:
+        Dictionary mapping the sensor ID of each IMU in the batch to its attitude array (see IMUFusion.update)
+
+    """
+    filters: Dict[int, IMUFusion] = {}
+    for batch in batches:
+        packets: Optional[numpy.ndarray] = batch.get(imuPacketType)
+        if packets is None:
+            continue
+        results: Dict[int, numpy.ndarray] = {}
+        for sensorID in numpy.unique(packets['ID']).tolist():
+            if sensorID not in filters:
+                filters[sensorID] = IMUFusion(samplePeriod, alpha, accelScale, gyroScale)
+            results[sensorID] = filters[sensorID].update(packets[packets['ID'] == sensorID])
+        yield results
+
+
+def exponentialFilter(values: numpy.ndarray, alpha: float, initial: numpy.ndarray) -> numpy.ndarray:
+    """Solve the recurrence y[k] = alpha * y[k - 1] + values[k] without looping over every sample.
+
+    Within a block, y[k] = alpha ** k * (initial + sum(values[j] / alpha ** j)), which is a cumulative
+    sum. The blocks are kept short enough that alpha ** -k can not overflow.
+
+    Args:
+        values: The input, with samples along the first axis
+        alpha: The decay factor, in [0, 1)
+        initial: The value of y before the first sample
+
+    Returns:
+        y for every sample
+
+    """
+    if not alpha:
+        return values.copy()
+    output: numpy.ndarray = numpy.empty_like(values, dtype=numpy.float64)
+    blockSize: int = max(1, min(4096, int(250 / -math.log10(alpha))))
+    previous: numpy.ndarray = numpy.asarray(initial, dtype=numpy.float64)
+    for start in range(0, len(values), blockSize):
+        block: numpy.ndarray = values[start:start + blockSize]
+        decay: numpy.ndarray = alpha ** numpy.arange(1, len(block) + 1, dtype=numpy.float64)
+        decay = decay.reshape((-1,) + (1,) * (block.ndim - 1))
+        output[start:start + len(block)] = decay * (previous + numpy.cumsum(block / decay, axis=0))
+        previous = output[start + len(block) - 1]
+    return output
+
+
+def eulerToQuaternion(attitude: numpy.ndarray) -> numpy.ndarray:
+    """Convert roll, pitch and yaw (z-y-x order) to unit quaternions.
+
+    Args:
+        attitude: Array of shape (n, 3) holding roll, pitch and yaw in radians
+
+    Returns:
+        Array of shape (n, 4) holding w, x, y and z
+
+    """
+    halfAngles: numpy.ndarray = attitude / 2
+    cos: numpy.ndarray = numpy.cos(halfAngles)
+    sin: numpy.ndarray = numpy.sin(halfAngles)
+    cosRoll, cosPitch, cosYaw = cos[:, 0], cos[:, 1], cos[:, 2]
+    sinRoll, sinPitch, sinYaw = sin[:, 0], sin[:, 1], sin[:, 2]
+    return numpy.column_stack((cosRoll * cosPitch * cosYaw + sinRoll * sinPitch * sinYaw,
+                               sinRoll * cosPitch * cosYaw - cosRoll * sinPitch * sinYaw,
+                               cosRoll * sinPitch * cosYaw + sinRoll * cosPitch * sinYaw,
+                               cosRoll * cosPitch * sinYaw - sinRoll * sinPitch * cosYaw))
+
+
+def rotateByQuaternion(quaternion: numpy.ndarray, vectors: numpy.ndarray) -> numpy.ndarray:
+    """Rotate body frame vectors into the world frame.
+
+    Args:
+        quaternion: Array of shape (n, 4) holding the unit quaternions w, x, y and z
+        vectors: Array of shape (n, 3) holding the vectors to rotate
+
+    Returns:
+        Array of shape (n, 3) holding the rotated vectors
+
+    """
+    scalar: numpy.ndarray = quaternion[:, :1]
+    axis: numpy.ndarray = quaternion[:, 1:]
+    # v' = v + 2w(u x v) + 2u x (u x v)
+    cross: numpy.ndarray = 2 * numpy.cross(axis, vectors)
+    return vectors + scalar * cross + numpy.cross(axis, cross)
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Run the data processing as a graph of memoized stages.
+
+Each Stage declares the stages it takes as input, a version, and its parameters. A
+stage's fingerprint is a hash of those, plus the fingerprints of its inputs, so
+changing a calibration coefficent or bumping the version of one formula only changes
+the fingerprints downstream of it. Outputs are memoized by fingerprint (in memory,
+and optionally on disk), and only stages whose fingerprint changed are run again.
+Stages that do not depend on each other, such as the BME280 compensation and the IMU
+fusion, run at the same time on a thread (or process) pool.
+
+flightPipeline builds the standard graph for a log file:
+read -> calibrate -> compensate, decode -> compensate / imu, and decode / compensate / imu -> export.
+The raw log is never memoized. The read and decode stages watch the log file instead, so
+they rerun when it changes, and decode streams the log in chunks (see
+dataExtraction.openFileStreaming) rather than loading it whole. The decoded packets are
+kept whole, as the later stages work on every packet of a sensor at once.
+"""
+import copy
+import hashlib
+import os
+import pickle  # nosec: only used for the pipeline's own cache files
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy
+
+from CalibrationCode.bmeCalibration import CompensateBME280Array
+from CalibrationCode.customObjs import Stage
+from CalibrationCode.dataExport import CSVExporter, CompensatedType, formatCSVRows
+from CalibrationCode.dataExtraction import (defaultChunkPackets, headerSize, BME280CalType, extractPresCalCoefs,
+                                            openFileStreaming, openLogFile, readFully, splitBytesFile)
+from CalibrationCode.imuFusion import fuseIMUBatches
+from CalibrationCode.typeAliases import PacketBatchType
+
+
+class Pipeline:
+    """A graph of stages, run with memoization.
+
+    Args:
+        stages (Iterable[Stage]): The stages of the pipeline.
+        cacheDir (str): Directory to also memoize outputs in, so they are kept between runs. The outputs
+            must be picklable. None to only memoize in memory. Pipelines can share a directory, as each
+            one only removes the cache files it wrote or loaded itself.
+        executor (Executor): The pool to run stages on. None for a thread pool per run.
+
+    Attributes
+        stages (Dict[str, Stage]): The stages, by name.
+        lastRun (List[str]): The names of the stages that were actually computed (not memoized) by the last run.
+
+    """
+
+    def __init__(self, stages: Iterable[Stage] = (), cacheDir: Optional[Union[str, os.PathLike]] = None,
+                 executor: Optional[Executor] = None) -> None:
+        """Initialize Instance."""  # noqa: I101
+        self.stages: Dict[str, Stage] = {}
+        self.cacheDir: Optional[Path] = None if cacheDir is None else Path(cacheDir)
+        if self.cacheDir is not None:
+            self.cacheDir.mkdir(parents=True, exist_ok=True)
+        self.executor: Optional[Executor] = executor
+        self.lastRun: List[str] = []
+        self._memory: Dict[str, Tuple[str, object]] = {}
+        for stage in stages:
+            self.setStage(stage)
+
+    def setStage(self, stage: Stage) -> None:
+        """Add a stage, or replace the stage with the same name.
+
+        Args:
+            stage: The stage to set
+
+        """
+        self.stages[stage.name] = stage
+
+    def fingerprints(self, targets: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """Calculate the fingerprint of each stage needed for the targets.
+
+        Args:
+            targets: The stages of interest, or None for every stage
+
+        Returns:
+            Dictionary of the fingerprint of each stage, in an order where inputs come before their users
+
+        """
+        fingerprints: Dict[str, str] = {}
+        for name in self._order(self.stages if targets is None else targets):
+            stage: Stage = self.stages[name]
+            digest = hashlib.sha256()
+            for part in (stage.name, stage.version, _qualifiedName(stage.function)):
+                digest.update(repr(part).encode('utf-8') + b'\0')
+            for key in sorted(stage.params):
+                digest.update(key.encode('utf-8') + b'\0' + _fingerprintValue(stage.params[key]) + b'\0')
+            for filePath in stage.watchFiles:
+                fileStat = os.stat(filePath)
+                digest.update(repr((str(filePath), fileStat.st_size, fileStat.st_mtime_ns)).encode('utf-8') + b'\0')
+            for inputName in stage.inputs:
+                digest.update(fingerprints[inputName].encode('utf-8') + b'\0')
+            fingerprints[name] = digest.hexdigest()
+        return fingerprints
+
+    def run(self, targets: Optional[Iterable[str]] = None) -> Dict[str, object]:
+        """Run the stages needed for the targets, reusing memoized outputs where possible.
+
+        Args:
+            targets: The stages to get the outputs of, or None for every stage
+
+        Returns:
+            Dictionary of the output of each target stage
+
+        """
+        targetNames: List[str] = list(self.stages if targets is None else targets)
+        fingerprints: Dict[str, str] = self.fingerprints(targetNames)
+        outputs: Dict[str, object] = {}
+        pending: Set[str] = set(fingerprints)
+        running: Dict[Future, str] = {}
+        self.lastRun = []
+        executor: Executor = self.executor or ThreadPoolExecutor()
+        try:
+            while pending or running:
+                for name in [name for name in fingerprints if name in pending
+                             and all(inputName in outputs for inputName in self.stages[name].inputs)]:
+                    pending.remove(name)
+                    found, value = self._load(self.stages[name], fingerprints[name])
+                    if found:
+                        outputs[name] = value
+                        continue
+                    stage: Stage = self.stages[name]
+                    running[executor.submit(stage.function, *(outputs[inputName] for inputName in stage.inputs),
+                                            **stage.params)] = name
+                if not running:
+                    # Memoized outputs may have made more stages ready
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    outputs[name] = future.result()
+                    self._store(name, fingerprints[name], outputs[name])
+                    self.lastRun.append(name)
+        finally:
+            if self.executor is None:
+                executor.shutdown()
+        return {name: outputs[name] for name in targetNames}
+
+    def _order(self, targets: Iterable[str]) -> List[str]:
+        """Get the targets and everything they depend on, with inputs before their users.
+
+        Raises:
+            ValueError: A stage is missing, or the stages depend on each other in a loop
+
+        """
+        order: List[str] = []
+        visiting: Set[str] = set()
+
+        def visit(name: str) -> None:
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError('Pipeline stage ' + name + ' depends on itself')
+            if name not in self.stages:
+                raise ValueError('Pipeline has no stage named ' + name)
+            visiting.add(name)
+            for inputName in self.stages[name].inputs:
+                visit(inputName)
+            visiting.remove(name)
+            order.append(name)
+
+        for target in targets:
+            visit(target)
+        return order
+
+    def _cachePath(self, name: str, fingerprint: str) -> Optional[Path]:
+        return None if self.cacheDir is None else self.cacheDir / (name + '-' + fingerprint + '.pickle')
+
+    def _load(self, stage: Stage, fingerprint: str) -> Tuple[bool, object]:
+        """Get the memoized output of a stage, if there is one for this fingerprint that passes its checkOutput."""
+        memoized: Optional[Tuple[str, object]] = self._memory.get(stage.name)
+        cachePath: Optional[Path] = self._cachePath(stage.name, fingerprint)
+        if memoized is not None and memoized[0] == fingerprint:
+            value: object = memoized[1]
+        elif cachePath is not None and cachePath.exists():
+            with open(cachePath, mode='rb') as fileObj:
+                value = pickle.load(fileObj)  # nosec: written by _store
+            self._memory[stage.name] = (fingerprint, value)
+        else:
+            return False, None
+        if stage.checkOutput is not None and not stage.checkOutput(value):
+            return False, None
+        return True, value
+
+    def _store(self, name: str, fingerprint: str, value: object) -> None:
+        """Memoize the output of a stage, replacing the one this pipeline had for its previous fingerprint.
+
+        Only that one cache file is removed, so other pipelines sharing the cache directory keep theirs.
+        """
+        previous: Optional[Tuple[str, object]] = self._memory.get(name)
+        self._memory[name] = (fingerprint, value)
+        cachePath: Optional[Path] = self._cachePath(name, fingerprint)
+        if cachePath is not None:
+            if previous is not None and previous[0] != fingerprint:
+                stalePath: Path = cachePath.with_name(name + '-' + previous[0] + '.pickle')
+                if stalePath.exists():
+                    stalePath.unlink()
+            with open(cachePath, mode='wb') as fileObj:
+                pickle.dump(value, fileObj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _qualifiedName(function: object) -> str:
+    """Name a stage function, so swapping it for another one changes the fingerprint."""
+    return getattr(function, '__module__', '') + '.' + getattr(function, '__qualname__', repr(function))
+
+
+def _fingerprintValue(value: object) -> bytes:
+    """Turn a stage parameter into bytes for hashing.
+
+    numpy arrays are hashed by their contents, as their repr leaves values out of large arrays.
+    """
+    if isinstance(value, numpy.ndarray):
+        return value.dtype.str.encode('utf-8') + repr(value.shape).encode('utf-8') + value.tobytes()
+    return repr(value).encode('utf-8')
+
+
+def readHeader(filePath: Union[str, os.PathLike]) -> List[List[str]]:
+    """Read stage: read the header of a (possibly compressed) log file, leaving the packets for decodeLog.
+
+    Args:
+        filePath: The path to the log file
+
+    Returns:
+        The header, split into a section for each device
+
+    """
+    with openLogFile(filePath) as fileObj:
+        header, _ = splitBytesFile(readFully(fileObj, headerSize))
+    return header
+
+
+def calibrateLog(header: List[List[str]]) -> BME280CalType:
+    """Calibrate stage: extract the BME280 calibration coefficents from the header.
+
+    Args:
+        header: The output of readHeader
+
+    Returns:
+        Calibration Coefficents for each pressure sensor
+
+    """
+    # extractPresCalCoefs edits the header, so leave the memoized one alone
+    return extractPresCalCoefs([list(section) for section in header])
+
+
+def decodeLog(filePath: Union[str, os.PathLike], chunkPackets: int = defaultChunkPackets) -> PacketBatchType:
+    """Decode stage: decode all of the packets, reading the log a chunk at a time.
+
+    Only the decoded packets are kept, and not the raw bytes of the log.
+
+    Args:
+        filePath: The path to the log file
+        chunkPackets: The number of packets to read and decode at a time
+
+    Returns:
+        The decoded packets, see dataExtraction.decodePacketChunk
+
+    """
+    chunks: Dict[int, List[numpy.ndarray]] = {}
+    _, batches = openFileStreaming(filePath, chunkPackets)
+    with batches:
+        for batch in batches:
+            for packetType, packets in batch.items():
+                chunks.setdefault(packetType, []).append(packets)
+    return {packetType: numpy.concatenate(arrays) for packetType, arrays in chunks.items()}
+
+
+def compensateBME280s(batch: PacketBatchType, calibrations: BME280CalType) -> CompensatedType:
+    """Compensate stage: calculate SI values for every BME280 with calibration coefficents.
+
+    Args:
+        batch: The output of decodeLog
+        calibrations: The output of calibrateLog
+
+    Returns:
+        The compensated values, by sensor ID
+
+    """
+    compensated: CompensatedType = {}
+    packets: Optional[numpy.ndarray] = batch.get(0x0a)
+    if packets is None:
+        return compensated
+    for sensorID in numpy.unique(packets['ID']).tolist():
+        if sensorID in calibrations:
+            rows: numpy.ndarray = packets[packets['ID'] == sensorID]
+            compensated[sensorID] = CompensateBME280Array(calibrations[sensorID], rows['uTemp'],
+                                                          rows['uPres'], rows['uHumid'])
+    return compensated
+
+
+def fuseIMUs(batch: PacketBatchType, samplePeriod: float) -> Dict[int, numpy.ndarray]:
+    """IMU stage: estimate the attitude and motion of every IMU.
+
+    Args:
+        batch: The output of decodeLog
+        samplePeriod: The time between IMU samples, in seconds
+
+    Returns:
+        The attitude arrays, by sensor ID, see imuFusion.IMUFusion.update
+
+    """
+    return next(fuseIMUBatches([batch], samplePeriod), {})
+
+
+def exportLog(batch: PacketBatchType, compensated: CompensatedType, attitudes: Dict[int, numpy.ndarray],
+              outDir: Union[str, os.PathLike], chunkPackets: int = defaultChunkPackets) -> List[str]:
+    """Export stage: write the sensor and IMU attitude CSV files.
+
+    The arrays are written a piece of chunkPackets rows at a time, as formatting them as CSV takes
+    several times their size in memory.
+
+    Args:
+        batch: The output of decodeLog
+        compensated: The output of compensateBME280s, written as is rather than compensated again
+        attitudes: The output of fuseIMUs
+        outDir: The directory to write the files to
+        chunkPackets: The number of rows to format and write at a time
+
+    Returns:
+        The paths of the files written
+
+    """
+    with CSVExporter(outDir) as exporter:
+        for piece in _exportPieces(batch, compensated, chunkPackets):
+            exporter.write(*piece)
+        paths: List[Path] = [exporter.sensorPath((sensorID, packetType)) for packetType, packets in batch.items()
+                             for sensorID in numpy.unique(packets['ID']).tolist()]
+    for sensorID, attitude in attitudes.items():
+        names: Tuple[str, ...] = attitude.dtype.names or ()
+        paths.append(Path(outDir) / ('sensor' + str(sensorID) + '_attitude.csv'))
+        with open(paths[-1], mode='wb') as fileObj:
+            fileObj.write((','.join(names) + '\n').encode('ascii'))
+            for start in range(0, len(attitude), chunkPackets):
+                fileObj.write(formatCSVRows(attitude[name][start:start + chunkPackets] for name in names))
+    return sorted(str(path) for path in paths)
+
+
+def _exportPieces(batch: PacketBatchType, compensated: CompensatedType,
+                  chunkPackets: int) -> Iterator[Tuple[PacketBatchType, CompensatedType]]:
+    """Cut each packet type of a batch into pieces, with the compensated values of the BME280s in each piece."""
+    for packetType, packets in batch.items():
+        # Number of packets from each sensor in the earlier pieces, which is where its compensated values start
+        written: Dict[int, int] = {}
+        for start in range(0, len(packets), chunkPackets):
+            piece = packets[start:start + chunkPackets]
+            pieceCompensated: CompensatedType = {}
+            sensorIDs, counts = numpy.unique(piece['ID'], return_counts=True)
+            for sensorID, count in zip(sensorIDs.tolist(), counts.tolist()):
+                first: int = written.get(sensorID, 0)
+                written[sensorID] = first + count
+                if packetType == 0x0a and sensorID in compensated:
+                    pieceCompensated[sensorID] = copy.copy(compensated[sensorID])
+                    for name in ('temperature', 'tFine', 'pressure', 'humidity'):
+                        setattr(pieceCompensated[sensorID], name,
+                                getattr(compensated[sensorID], name)[first:first + count])
+            yield {packetType: piece}, pieceCompensated
+
+
+def _filesExist(paths: object) -> bool:
+    """Check if the files from exportLog are all still there, so deleting one reruns the export."""
+    return isinstance(paths, list) and all(os.path.exists(path) for path in paths)
+
+
+def flightPipeline(filePath: Union[str, os.PathLike], outDir: Union[str, os.PathLike], samplePeriod: float = 0.01,
+                   cacheDir: Optional[Union[str, os.PathLike]] = None,
+                   executor: Optional[Executor] = None) -> Pipeline:
+    """Build the standard pipeline for processing a log file.
+
+    Args:
+        filePath: The path to the log file
+        outDir: The directory to export to
+        samplePeriod: The time between IMU samples, in seconds
+        cacheDir: Directory to memoize outputs in between runs, see Pipeline
+        executor: The pool to run stages on, see Pipeline
+
+    Returns:
+        The pipeline, with the stages read, calibrate, decode, compensate, imu and export
+
+    """
+    return Pipeline((
+        Stage('read', readHeader, params={'filePath': str(filePath)}, watchFiles=(filePath,)),
+        Stage('calibrate', calibrateLog, ('read',)),
+        Stage('decode', decodeLog, params={'filePath': str(filePath)}, watchFiles=(filePath,)),
+        Stage('compensate', compensateBME280s, ('decode', 'calibrate')),
+        Stage('imu', fuseIMUs, ('decode',), params={'samplePeriod': samplePeriod}),
+        Stage('export', exportLog, ('decode', 'compensate', 'imu'), params={'outDir': str(outDir)},
+              checkOutput=_filesExist),
+    ), cacheDir, executor)
+
+
+# Run this if the module is run manually.
+if __name__ == '__main__':
+    flightResults = flightPipeline('Test Logs/easRV12_28_Oct_2016_04_39_20.log', 'Exported Data').run()
+    print('\n'.join(flightResults['export']))   # type: ignore
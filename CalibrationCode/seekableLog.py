@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Write and query seekable, frame indexed compressed EAS log files.
+
+A seekable log is a normal multi-member gzip file, so any gzip tool (or
+dataExtraction.openLogFile) decompresses it back to the original log. The first
+member holds the header, and every following member (frame) holds a fixed number of
+whole packets. Each member carries an 'EA' gzip extra field recording its compressed
+size, the index of its first packet, its packet count, and a bitmask of the sensor IDs
+it holds packets from. This lets queryLog walk the frame headers, and only decompress
+the frames that overlap the requested packet range and sensors.
+"""
+import struct
+import zlib
+from os import PathLike
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy
+
+from CalibrationCode.customObjs import LogFrame
+from CalibrationCode.dataExtraction import (defaultChunkPackets, gzipMagic, headerSize, packetSize,
+                                            PacketBatchStream, decodePacketChunk, iterPacketBatches, openLogFile,
+                                            openLogHeader, readFully, splitBytesFile)
+from CalibrationCode.typeAliases import PacketBatchType
+
+_extraID = b'EA'
+_frameInfo = struct.Struct('<IQI32s')
+# Fixed gzip header, FEXTRA flag set, then XLEN, the subfield ID and length, and the frame info
+_memberHeader = struct.Struct('<2sBBIBBH2sH')
+_memberHeaderSize = _memberHeader.size + _frameInfo.size
+_sensorMaskBits = 256
+
+
+def writeSeekableLog(srcPath: Union[str, PathLike], dstPath: Union[str, PathLike],
+                     framePackets: int = defaultChunkPackets, compressLevel: int = 6) -> None:
+    """Compress a log file into the seekable format.
+
+    Args:
+        srcPath: The log file to compress, which may itself be compressed (see dataExtraction.openLogFile)
+        dstPath: Path to write the seekable log to
+        framePackets: The number of packets in each independently compressed frame
+        compressLevel: The zlib compression level
+
+    """
+    frameSize: int = framePackets * packetSize
+    with openLogFile(srcPath) as srcObj, open(dstPath, mode='wb') as dstObj:
+        dstObj.write(_gzipMember(readFully(srcObj, headerSize), 0, 0, bytes(_sensorMaskBits // 8),
+                                 compressLevel))
+        firstPacket: int = 0
+        while True:
+            data: bytes = readFully(srcObj, frameSize)
+            if not data:
+                return
+            # A trailing partial packet is kept in the last frame, so the log decompresses unchanged
+            packetCount: int = len(data) // packetSize
+            sensorMask: bytes = _sensorMask(decodePacketChunk(data[:packetCount * packetSize]))
+            dstObj.write(_gzipMember(data, firstPacket, packetCount, sensorMask, compressLevel))
+            firstPacket += packetCount
+            if len(data) < frameSize:
+                return
+
+
+def _sensorMask(batch: PacketBatchType) -> bytes:
+    """Get the bitmask of the sensor IDs in a decoded batch."""
+    sensorIDs: numpy.ndarray = numpy.unique(numpy.concatenate(
+        [packets['ID'].astype(numpy.int64) for packets in batch.values()] or [numpy.empty(0, numpy.int64)]))
+    if sensorIDs.size and sensorIDs[-1] >= _sensorMaskBits:
+        # Unusually large ID, mark the frame as possibly holding every sensor
+        return b'\xff' * (_sensorMaskBits // 8)
+    bits: numpy.ndarray = numpy.zeros(_sensorMaskBits, dtype=bool)
+    bits[sensorIDs] = True
+    return numpy.packbits(bits, bitorder='little').tobytes()
+
+
+def _gzipMember(data: bytes, firstPacket: int, packetCount: int, sensorMask: bytes, compressLevel: int) -> bytes:
+    """Compress data into one gzip member carrying the frame info extra field."""
+    compressor = zlib.compressobj(compressLevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body: bytes = compressor.compress(data) + compressor.flush()
+    memberSize: int = _memberHeaderSize + len(body) + 8
+    # ID1 ID2, CM=deflate, FLG=FEXTRA, MTIME, XFL, OS=unknown, XLEN, then the subfield
+    header: bytes = _memberHeader.pack(gzipMagic, 8, 4, 0, 0, 255, 4 + _frameInfo.size,
+                                       _extraID, _frameInfo.size)
+    info: bytes = _frameInfo.pack(memberSize, firstPacket, packetCount, sensorMask)
+    return header + info + body + struct.pack('<II', zlib.crc32(data), len(data) & 0xffffffff)
+
+
+def readFrameIndex(filePath: Union[str, PathLike]) -> Optional[List[LogFrame]]:
+    """Read the frame index of a seekable log, without decompressing any of it.
+
+    Args:
+        filePath: The path to the log file
+
+    Returns:
+        The frames of the log, where the first frame is the header. None if the file is not a seekable log.
+
+    """
+    frames: List[LogFrame] = []
+    with open(filePath, mode='rb') as fileObj:
+        offset: int = 0
+        while True:
+            header: bytes = fileObj.read(_memberHeaderSize)
+            if not header:
+                return frames or None
+            if len(header) < _memberHeaderSize:
+                return None
+            magic, method, flags, _, _, _, extraLength, extraID, infoLength = _memberHeader.unpack_from(header)
+            if ((magic, method, flags, extraLength, extraID, infoLength)
+                    != (gzipMagic, 8, 4, 4 + _frameInfo.size, _extraID, _frameInfo.size)):
+                return None
+            size, firstPacket, packetCount, sensorMask = _frameInfo.unpack_from(header, _memberHeader.size)
+            frames.append(LogFrame(offset, size, firstPacket, packetCount, sensorMask))
+            offset += size
+            fileObj.seek(offset)
+
+
+def queryLog(filePath: Union[str, PathLike], startPacket: int = 0, stopPacket: Optional[int] = None,
+             sensorIDs: Optional[Iterable[int]] = None,
+             chunkPackets: int = defaultChunkPackets) -> Tuple[List[List[str]], Iterator[PacketBatchType]]:
+    """Decode only the packets in a range of the log and/or from some of the sensors.
+
+    For seekable logs, frames outside of the query are skipped without being decompressed.
+    Any other log (plain or compressed) is streamed through and filtered.
+
+    Args:
+        filePath: The path to the log file
+        startPacket: Index of the first packet to include
+        stopPacket: Index one past the last packet to include, or None for the end of the log
+        sensorIDs: IDs of the sensors to include, or None for all of them
+        chunkPackets: The number of packets to decode per batch when the log is not seekable
+
+    Returns:
+        The header (split into section for each device), and an iterator over the decoded packet batches
+        matching the query.
+
+    """
+    wanted: Optional[Set[int]] = None if sensorIDs is None else set(sensorIDs)
+    frames: Optional[List[LogFrame]] = readFrameIndex(filePath)
+    if frames is not None:
+        with open(filePath, mode='rb') as seekableFile:
+            header, _ = splitBytesFile(_readFrame(seekableFile, frames[0]))
+        return header, _seekableQuery(filePath, frames[1:], startPacket, stopPacket, wanted)
+
+    header, fileObj = openLogHeader(filePath)
+    return header, PacketBatchStream(fileObj, _streamedQuery(fileObj, startPacket, stopPacket, wanted, chunkPackets))
+
+
+def _readFrame(fileObj: BinaryIO, frame: LogFrame) -> bytes:
+    """Decompress one frame of a seekable log."""
+    fileObj.seek(frame.offset)
+    return zlib.decompress(fileObj.read(frame.size), wbits=16 + zlib.MAX_WBITS)
+
+
+def _seekableQuery(filePath: Union[str, PathLike], frames: List[LogFrame], startPacket: int,
+                   stopPacket: Optional[int], sensorIDs: Optional[Set[int]]) -> Iterator[PacketBatchType]:
+    """Decode the frames of a seekable log that overlap the query."""
+    with open(filePath, mode='rb') as fileObj:
+        for frame in frames:
+            if stopPacket is not None and frame.firstPacket >= stopPacket:
+                return
+            if frame.firstPacket + frame.packetCount <= startPacket:
+                continue
+            if sensorIDs is not None and not any(frame.hasSensor(sensorID) for sensorID in sensorIDs):
+                continue
+            data: bytes = _readFrame(fileObj, frame)[:frame.packetCount * packetSize]
+            yield _filterBatch(decodePacketChunk(data, frame.firstPacket), startPacket, stopPacket, sensorIDs)
+
+
+def _streamedQuery(fileObj: BinaryIO, startPacket: int, stopPacket: Optional[int], sensorIDs: Optional[Set[int]],
+                   chunkPackets: int) -> Iterator[PacketBatchType]:
+    """Decode a whole log as a stream, keeping the packets that match the query."""
+    for batch in iterPacketBatches(fileObj, chunkPackets):
+        if stopPacket is not None and batch and min(int(packets['index'][0])
+                                                    for packets in batch.values()) >= stopPacket:
+            return
+        yield _filterBatch(batch, startPacket, stopPacket, sensorIDs)
+
+
+def _filterBatch(batch: PacketBatchType, startPacket: int, stopPacket: Optional[int],
+                 sensorIDs: Optional[Set[int]]) -> PacketBatchType:
+    """Keep the packets of a batch that are in the packet range and from the wanted sensors."""
+    filtered: PacketBatchType = {}
+    for packetType, packets in batch.items():
+        keep: numpy.ndarray = packets['index'] >= startPacket
+        if stopPacket is not None:
+            keep &= packets['index'] < stopPacket
+        if sensorIDs is not None:
+            keep &= numpy.isin(packets['ID'], list(sensorIDs))
+        if keep.any():
+            filtered[packetType] = packets[keep]
+    return filtered
@@ -3,7 +3,10 @@
 """Custom Type Aliases for the module."""
 from typing import Tuple, Dict, Union, List
 
+from numpy import ndarray
+
 TempCoefsType = Tuple[int, int, int]
 PresCoefsType = Tuple[int, int, int, int, int, int, int, int, int]
 HumidityCoefsType = Tuple[int, int, int, int, int, int]
 UCompDataType = List[Dict[str, Union[int]]]
+PacketBatchType = Dict[int, ndarray]
@@ -0,0 +1,94 @@
+"""Unit Tests for dataExport.py."""
+# pylint: disable=invalid-name
+import csv
+from pathlib import Path
+
+import numpy
+import pytest
+
+from CalibrationCode import dataExport, dataExtraction
+from CalibrationCode.bmeCalibration import CompensateBME280Array, CompensateBME280Native
+
+LOG_FILE = 'Test Logs/easRV12_28_Oct_2016_04_39_20.log'
+
+
+def test_csvExportWorks(tmp_path: Path) -> None:
+    """Test if the CSV exporter writes every packet, with compensated BME280 values."""
+    header, batches = dataExtraction.openFileStreaming(LOG_FILE, chunkPackets=500)
+    calibrations = dataExtraction.extractPresCalCoefs(header)
+    with dataExport.CSVExporter(tmp_path, calibrations) as exporter:
+        exporter.writeBatches(batches)
+
+    _, rawData = dataExtraction.openFileNonInteractive(LOG_FILE)
+    expected = dataExtraction.processPackets(dataExtraction.splitSensorData(rawData))
+    rowCount = 0
+    for file in tmp_path.iterdir():
+        with open(file, newline='', encoding='utf-8') as fileObj:
+            rows = list(csv.DictReader(fileObj))
+        rowCount += len(rows)
+        for row in rows:
+            if 'uHumid' in row:
+                sensor = calibrations[int(file.name[len('sensor'):].split('_')[0])]
+                compensated = CompensateBME280Native(sensor, int(row['uTemp']), int(row['uPres']),
+                                                     int(row['uHumid']))
+                assert float(row['temperature']) == pytest.approx(compensated.temperature, abs=1e-6)
+                assert float(row['pressure']) == pytest.approx(compensated.pressure, abs=1e-6)
+                assert float(row['humidity']) == pytest.approx(compensated.humidity, abs=1e-6)
+    assert rowCount == len(expected)
+
+
+def test_columnarExportRoundTrips(tmp_path: Path) -> None:
+    """Test if a columnar export reads back to the decoded values."""
+    _, stream = dataExtraction.openFileStreaming(LOG_FILE, chunkPackets=500)
+    batches = list(stream)
+    with dataExport.ColumnarExporter(tmp_path) as exporter:
+        exporter.writeBatches(batches)
+
+    for (sensorID, packetType), _ in dataExport.sensorColumns(batches[0]):
+        path = exporter.sensorPath((sensorID, packetType))
+        columns = dataExport.readColumnar(path)
+        allPackets = numpy.concatenate([batch[packetType] for batch in batches if packetType in batch])
+        allPackets = allPackets[allPackets['ID'] == sensorID]
+        for name, values in columns.items():
+            assert values.dtype == allPackets.dtype[name]
+            assert numpy.array_equal(values, allPackets[name])
+
+
+def test_formatCSVRowsWorks() -> None:
+    """Test the bulk CSV formatting on signs, widths, rounding, and values it can not write as fixed point."""
+    columns = [numpy.array([0, -5, 123, -2 ** 63], dtype=numpy.int64),
+               numpy.array([0, 1, 2 ** 64 - 1, 7], dtype=numpy.uint64),
+               numpy.array([0.0, -1.5, -0.0000001, 12345.6789]),
+               numpy.array([numpy.nan, 1.0, numpy.inf, -2.5]),
+               numpy.array([-1, 0, -32768, 5], dtype=numpy.int16)]
+    assert dataExport.formatCSVRows(columns) == (b'0,0,0.000000,nan,-1\n'
+                                                 b'-5,1,-1.500000,1.0,0\n'
+                                                 b'123,18446744073709551615,0.000000,inf,-32768\n'
+                                                 b'-9223372036854775808,7,12345.678900,-2.5,5\n')
+    assert dataExport.formatCSVRows([numpy.array([1.25, 10.0])], precision=0) == b'1\n10\n'
+    assert dataExport.formatCSVRows([numpy.empty(0, dtype=numpy.int32)]) == b''
+
+
+def test_sensorExporterIsAbstract(tmp_path: Path) -> None:
+    """Test if the exporter base class can not be used without implementing the file handling."""
+    with pytest.raises(TypeError):
+        # pylint: disable=protected-access,abstract-class-instantiated
+        dataExport._SensorExporter(tmp_path)     # type: ignore
+
+
+def test_compensatedLengthIsChecked(tmp_path: Path) -> None:
+    """Test if compensated values that do not line up with the packets in the batch are rejected."""
+    header, batches = dataExtraction.openFileStreaming(LOG_FILE, chunkPackets=500)
+    calibrations = dataExtraction.extractPresCalCoefs(header)
+    with batches:
+        batch = next(batches)
+    _, rawData = dataExtraction.openFileNonInteractive(LOG_FILE)
+    wholeLog = dataExtraction.decodePacketChunk(rawData)[0x0a]
+    sensorID = int(next(iter(calibrations)))
+    rows = wholeLog[wholeLog['ID'] == sensorID]
+    compensated = {sensorID: CompensateBME280Array(calibrations[sensorID], rows['uTemp'], rows['uPres'],
+                                                   rows['uHumid'])}
+    for exporterType in (dataExport.CSVExporter, dataExport.ColumnarExporter):
+        with exporterType(tmp_path / exporterType.__name__) as exporter:
+            with pytest.raises(ValueError):
+                exporter.write(batch, compensated)
@@ -1,7 +1,12 @@
 """Unit Tests for dataExtraction.py."""
 # pylint: disable=invalid-name
+import bz2
+import gzip
+import lzma
 from pathlib import Path
 
+import pytest
+
 from CalibrationCode import dataExtraction
 
 
@@ -65,3 +70,78 @@ def test_extractPacketDataWorks() -> None:
         for key, value in packet.items():
             assert key in validKeys
             assert isinstance(value, int)
+
+
+def test_streamingDecodeMatchesProcessPackets() -> None:
+    """Test if the chunked numpy decoder gives the same values as processPackets."""
+    logDir: Path = Path('Test Logs')
+    for file in logDir.iterdir():
+        header, rawData = dataExtraction.openFileNonInteractive(file)
+        expected = dataExtraction.processPackets(dataExtraction.splitSensorData(rawData))
+        streamHeader, batches = dataExtraction.openFileStreaming(file, chunkPackets=100)
+        assert streamHeader == header
+        decoded = []
+        for batch in batches:
+            for packets in batch.values():
+                for packet in packets:
+                    decoded.append((int(packet['index']),
+                                    {name: int(packet[name]) for name in packets.dtype.names or () if name != 'index'}))
+        decoded.sort(key=lambda item: item[0])
+        assert [packet for _, packet in decoded] == expected
+
+
+def test_compressedLogsWork(tmp_path: Path) -> None:
+    """Test if compressed logs are detected and read the same as the plain log."""
+    logFile = Path('Test Logs/easRV12_28_Oct_2016_04_39_20.log')
+    plainHeader, plainData = dataExtraction.openFileNonInteractive(logFile)
+    expected = dataExtraction.processPackets(dataExtraction.splitSensorData(plainData))
+    for module in (gzip, bz2, lzma):
+        # No extension, so the compression can only be found from the magic bytes
+        compressedFile = tmp_path / module.__name__
+        compressedFile.write_bytes(module.compress(logFile.read_bytes()))
+        header, rawData = dataExtraction.openFileNonInteractive(compressedFile)
+        assert header == plainHeader
+        assert rawData == plainData
+        header, batches = dataExtraction.openFileStreaming(compressedFile, chunkPackets=100)
+        assert header == plainHeader
+        assert sum(len(packets) for batch in batches for packets in batch.values()) == len(expected)
+
+
+def test_zstdLogsWork(tmp_path: Path) -> None:
+    """Test if zstd compressed logs are read the same as the plain log, when zstandard is installed."""
+    zstandard = pytest.importorskip('zstandard')
+    logFile = Path('Test Logs/easRV12_28_Oct_2016_04_39_20.log')
+    compressedFile = tmp_path / 'zstd'
+    # Two frames, like the output of pzstd or of appending to a .zst file
+    contents = logFile.read_bytes()
+    compressor = zstandard.ZstdCompressor()
+    compressedFile.write_bytes(compressor.compress(contents[:50000]) + compressor.compress(contents[50000:]))
+    assert dataExtraction.openFileNonInteractive(compressedFile) == dataExtraction.openFileNonInteractive(logFile)
+
+
+def test_streamingClosesFile(tmp_path: Path) -> None:
+    """Test if the streamed log file is closed when used up, closed early, or when the header is bad."""
+    logFile = 'Test Logs/easRV12_28_Oct_2016_04_39_20.log'
+    _, batches = dataExtraction.openFileStreaming(logFile, chunkPackets=100)
+    fileObj = batches._fileObj     # pylint: disable=protected-access
+    for _ in batches:
+        pass
+    assert fileObj.closed
+
+    with dataExtraction.openFileStreaming(logFile, chunkPackets=100)[1] as batches:
+        next(batches)
+        fileObj = batches._fileObj     # pylint: disable=protected-access
+    assert fileObj.closed
+    with pytest.raises(StopIteration):
+        next(batches)
+
+    _, batches = dataExtraction.openFileStreaming(logFile, chunkPackets=100)
+    fileObj = batches._fileObj     # pylint: disable=protected-access
+    del batches
+    assert fileObj.closed
+
+    # The header is not valid utf-8, so reading it fails after the file was opened
+    badLog = tmp_path / 'bad.log'
+    badLog.write_bytes(b'\xff' * 0x800)
+    with pytest.raises(UnicodeDecodeError):
+        dataExtraction.openFileStreaming(badLog)
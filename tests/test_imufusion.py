@@ -0,0 +1,98 @@
+"""Unit Tests for imuFusion.py."""
+# pylint: disable=invalid-name
+import math
+import struct
+from typing import Sequence, Tuple
+
+import numpy
+import pytest
+
+from CalibrationCode import dataExtraction, imuFusion
+
+
+def _imuChunk(samples: Sequence[Tuple[int, ...]], sensorID: int = 5) -> bytes:
+    """Pack raw (accX, accY, accZ, gyroX, gyroY, gyroZ, temp) samples into type 0x07 packets."""
+    return b''.join(struct.pack('<IIhhhhhhhxx', sensorID, 0x07, *sample) for sample in samples)
+
+
+def test_exponentialFilterMatchesLoop() -> None:
+    """Test if the closed form recurrence matches a per sample loop."""
+    values = numpy.random.default_rng(0).normal(size=(10000, 2))
+    for alpha in (0.0, 0.2, 0.98, 0.9999):
+        expected = []
+        previous = numpy.array([1.0, -1.0])
+        for value in values:
+            previous = alpha * previous + value
+            expected.append(previous)
+        assert numpy.allclose(imuFusion.exponentialFilter(values, alpha, numpy.array([1.0, -1.0])), expected)
+
+
+def test_stationaryAndSpinning() -> None:
+    """Test a level IMU spinning about z at 10 degrees per second."""
+    samples = [(0, 0, 16384, 0, 0, 1310, 0)] * 1000
+    batch = dataExtraction.decodePacketChunk(_imuChunk(samples))
+    result = imuFusion.IMUFusion(0.01).update(batch[0x07])
+    assert numpy.array_equal(result['index'], numpy.arange(1000))
+    assert numpy.allclose(result['roll'], 0)
+    assert numpy.allclose(result['pitch'], 0)
+    assert result['yaw'][-1] == pytest.approx(math.radians(10) * 10)
+    assert numpy.allclose(result['qW'] ** 2 + result['qX'] ** 2 + result['qY'] ** 2 + result['qZ'] ** 2, 1)
+    for name in ('velX', 'velY', 'velZ', 'posX', 'posY', 'posZ'):
+        assert numpy.allclose(result[name], 0)
+
+
+def test_tiltConverges() -> None:
+    """Test if roll settles on the tilt seen by the accelerometer."""
+    samples = [(0, 8192, 14189, 0, 0, 0, 0)] * 2000
+    batch = dataExtraction.decodePacketChunk(_imuChunk(samples))
+    result = imuFusion.IMUFusion(0.01).update(batch[0x07])
+    assert math.degrees(result['roll'][-1]) == pytest.approx(30, abs=0.01)
+    assert abs(result['velZ'][-1]) < 1e-2
+
+
+def test_invertedAndTumbling() -> None:
+    """Test if roll stays right when the IMU is upside down or rolls over, rather than wrapping through level."""
+    samples = [(0, 50 if sample % 2 else -50, -16384, 0, 0, 0, 0) for sample in range(2000)]
+    result = imuFusion.IMUFusion(0.01).update(dataExtraction.decodePacketChunk(_imuChunk(samples))[0x07])
+    assert numpy.all(numpy.abs(numpy.abs(result['roll']) - math.pi) < math.radians(0.5))
+    assert numpy.all((result['roll'] > -math.pi) & (result['roll'] <= math.pi))
+    for name in ('velZ', 'posZ'):
+        assert numpy.allclose(result[name], 0, atol=0.05)
+
+    # Roll over at 90 degrees per second for 10 s, with the accelerometer seeing gravity turn around
+    roll = numpy.radians(90) * 0.01 * numpy.arange(1, 1001)
+    samples = [(0, int(round(16384 * math.sin(angle))), int(round(16384 * math.cos(angle))), 11790, 0, 0, 0)
+               for angle in roll]
+    data = _imuChunk(samples)
+    result = imuFusion.IMUFusion(0.01).update(dataExtraction.decodePacketChunk(data)[0x07])
+    wrapped = math.pi - numpy.mod(math.pi - roll, 2 * math.pi)
+    # Skip the first second, while the filter settles from its start on the first sample
+    assert numpy.allclose(numpy.angle(numpy.exp(1j * (result['roll'] - wrapped)))[100:], 0, atol=math.radians(0.5))
+    assert numpy.allclose(result['velZ'], 0, atol=0.05)
+
+    fusion = imuFusion.IMUFusion(0.01)
+    chunked = numpy.concatenate([fusion.update(dataExtraction.decodePacketChunk(data[start:start + 24 * 77])[0x07])
+                                 for start in range(0, len(data), 24 * 77)])
+    assert numpy.allclose(chunked['roll'], result['roll'])
+
+
+def test_chunkingDoesNotChangeResult() -> None:
+    """Test if the filter state carries over chunk boundaries, and every IMU gets its own filter."""
+    rng = numpy.random.default_rng(1)
+    samples = [tuple(int(value) for value in row) for row in rng.integers(-3000, 3000, (5000, 7))]
+    data = _imuChunk(samples, 5) + _imuChunk(samples, 6)
+    whole = next(imuFusion.fuseIMUBatches([dataExtraction.decodePacketChunk(data)], 0.001))
+    chunked = list(imuFusion.fuseIMUBatches(
+        (dataExtraction.decodePacketChunk(chunk, index) for chunk, index in
+         ((data[24 * start:24 * (start + 333)], start) for start in range(0, 10000, 333))), 0.001))
+    for sensorID in (5, 6):
+        joined = numpy.concatenate([results[sensorID] for results in chunked if sensorID in results])
+        for name in imuFusion.attitudeDtype.names or ():
+            assert numpy.allclose(joined[name], whole[sensorID][name])
+    assert numpy.allclose(whole[5]['roll'], whole[6]['roll'])
+
+
+def test_invalidAlpha() -> None:
+    """Test if an alpha outside of [0, 1) is rejected."""
+    with pytest.raises(ValueError):
+        imuFusion.IMUFusion(0.01, alpha=1)
@@ -0,0 +1,205 @@
+"""Unit Tests for pipeline.py."""
+# pylint: disable=invalid-name
+import csv
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, List, cast
+
+import numpy
+import pytest
+
+from CalibrationCode import dataExtraction, imuFusion, pipeline
+from CalibrationCode.bmeCalibration import CompensateBME280Native
+from CalibrationCode.customObjs import Stage
+from CalibrationCode.dataExport import CompensatedType
+from CalibrationCode.dataExtraction import BME280CalType
+from CalibrationCode.typeAliases import PacketBatchType, UCompDataType
+
+LOG_FILE = 'Test Logs/easRV12_28_Oct_2016_04_39_20.log'
+
+
+def _source(value: int) -> int:
+    """Return the value, a stand in for a read stage."""
+    return value
+
+
+def _double(value: int) -> int:
+    """Double the value."""
+    return value * 2
+
+
+def _add(first: int, second: int) -> int:
+    """Add two values."""
+    return first + second
+
+
+def _diamond() -> List[Stage]:
+    """Make a source feeding two branches that are joined back together."""
+    return [Stage('source', _source, params={'value': 3}),
+            Stage('left', _double, ('source',)),
+            Stage('right', _double, ('source',)),
+            Stage('join', _add, ('left', 'right'))]
+
+
+def test_onlyChangedStagesRerun() -> None:
+    """Test if outputs are memoized, and changing a stage only reruns it and the stages downstream."""
+    graph = pipeline.Pipeline(_diamond())
+    assert graph.run(['join']) == {'join': 12}
+    assert sorted(graph.lastRun) == ['join', 'left', 'right', 'source']
+    assert graph.run() == {'source': 3, 'left': 6, 'right': 6, 'join': 12}
+    assert not graph.lastRun
+
+    graph.setStage(Stage('left', _double, ('source',), version=2))
+    assert graph.run(['join']) == {'join': 12}
+    assert sorted(graph.lastRun) == ['join', 'left']
+
+    graph.setStage(Stage('source', _source, params={'value': 4}))
+    assert graph.run(['join']) == {'join': 16}
+    assert sorted(graph.lastRun) == ['join', 'left', 'right', 'source']
+
+
+def test_independentStagesRunConcurrently() -> None:
+    """Test if branches that do not depend on each other run at the same time."""
+    barrier = threading.Barrier(2, timeout=10)
+
+    def meet(value: int) -> int:
+        barrier.wait()
+        return value
+
+    stages = _diamond()
+    stages[1] = Stage('left', meet, ('source',))
+    stages[2] = Stage('right', meet, ('source',))
+    assert pipeline.Pipeline(stages).run(['join']) == {'join': 6}
+
+
+def test_diskCacheSurvivesRuns(tmp_path: Path) -> None:
+    """Test if a new pipeline with the same cache directory reuses the outputs."""
+    pipeline.Pipeline(_diamond(), tmp_path).run()
+    graph = pipeline.Pipeline(_diamond(), tmp_path)
+    assert graph.run(['join']) == {'join': 12}
+    assert not graph.lastRun
+    graph.setStage(Stage('right', _double, ('source',), version=2))
+    graph.run()
+    assert sorted(graph.lastRun) == ['join', 'right']
+    assert len(list(tmp_path.glob('right-*.pickle'))) == 1
+
+
+def test_badGraphs() -> None:
+    """Test if missing stages and loops are reported."""
+    with pytest.raises(ValueError):
+        pipeline.Pipeline([Stage('join', _add, ('left', 'right'))]).run()
+    with pytest.raises(ValueError):
+        pipeline.Pipeline([Stage('first', _double, ('second',)), Stage('second', _double, ('first',))]).run()
+
+
+def _imuLog(tmp_path: Path) -> Path:
+    """Write a copy of the test log with IMU (type 0x07) packets added, as the test logs have none."""
+    contents = Path(LOG_FILE).read_bytes()
+    contents = contents[:len(contents) - (len(contents) - dataExtraction.headerSize) % dataExtraction.packetSize]
+    samples = numpy.random.default_rng(2).integers(-300, 300, (3000, 7)) + [0, 0, 16384, 0, 0, 0, 0]
+    logFile = tmp_path / 'imu.log'
+    logFile.write_bytes(contents + b''.join(struct.pack('<IIhhhhhhhxx', 5, 0x07, *(int(value) for value in sample))
+                                            for sample in samples))
+    return logFile
+
+
+def _checkCompensated(compensated: CompensatedType, packets: UCompDataType, calibrations: BME280CalType) -> None:
+    """Check the compensate stage's output against compensating every BME280 packet with CompensateBME280Native."""
+    assert sorted(compensated) == sorted({packet['ID'] for packet in packets if packet['type'] == 0x0a})
+    for sensorID, values in compensated.items():
+        bme = [packet for packet in packets if packet['type'] == 0x0a and packet['ID'] == sensorID]
+        assert len(values.temperature) == len(bme)
+        for row, packet in enumerate(bme):
+            expected = CompensateBME280Native(calibrations[sensorID], packet['uTemp'], packet['uPres'],
+                                              packet['uHumid'])
+            assert values.temperature[row] == pytest.approx(expected.temperature)
+            assert values.pressure[row] == pytest.approx(expected.pressure)
+            assert values.humidity[row] == pytest.approx(expected.humidity)
+
+
+def test_flightPipelineWorks(tmp_path: Path) -> None:
+    """Test the standard pipeline against calling the stages by hand."""
+    logFile = _imuLog(tmp_path)
+    graph = pipeline.flightPipeline(logFile, tmp_path / 'export', samplePeriod=0.01)
+    results = graph.run()
+    assert sorted(graph.lastRun) == sorted(graph.stages)
+
+    header, rawData = dataExtraction.openFileNonInteractive(logFile)
+    calibrations = dataExtraction.extractPresCalCoefs(header)
+    assert results['read'] == header
+    assert results['calibrate'] == calibrations
+    packets = dataExtraction.processPackets(dataExtraction.splitSensorData(rawData))
+    decoded = cast(PacketBatchType, results['decode'])
+    assert sum(len(array) for array in decoded.values()) == len(packets)
+
+    _checkCompensated(cast(CompensatedType, results['compensate']), packets, calibrations)
+
+    attitudes = cast(Dict[int, numpy.ndarray], results['imu'])
+    assert list(attitudes) == [5]
+    expectedAttitude = imuFusion.IMUFusion(0.01).update(dataExtraction.decodePacketChunk(rawData)[0x07])
+    for name in imuFusion.attitudeDtype.names or ():
+        assert numpy.allclose(attitudes[5][name], expectedAttitude[name])
+
+    exported = cast(List[str], results['export'])
+    assert exported and all(Path(path).exists() for path in exported)
+    assert str(tmp_path / 'export' / 'sensor5_attitude.csv') in exported
+
+    graph.setStage(Stage('imu', pipeline.fuseIMUs, ('decode',), params={'samplePeriod': 0.005}))
+    graph.run()
+    assert sorted(graph.lastRun) == ['export', 'imu']
+
+
+def test_flightPipelineInvalidation(tmp_path: Path) -> None:
+    """Test if the export uses the compensate stage's output, and is rerun when it changes or its files go missing."""
+    graph = pipeline.flightPipeline(LOG_FILE, tmp_path / 'export')
+    graph.run()
+    graph.setStage(Stage('compensate', pipeline.compensateBME280s, ('decode', 'calibrate'), version=2))
+    graph.run()
+    assert sorted(graph.lastRun) == ['compensate', 'export']
+
+    def shiftTemperature(batch: PacketBatchType, calibrations: BME280CalType) -> CompensatedType:
+        compensated = pipeline.compensateBME280s(batch, calibrations)
+        for values in compensated.values():
+            values.temperature = values.temperature + 100
+        return compensated
+
+    graph.setStage(Stage('compensate', shiftTemperature, ('decode', 'calibrate')))
+    results = graph.run()
+    assert sorted(graph.lastRun) == ['compensate', 'export']
+    compensated = cast(CompensatedType, results['compensate'])
+    sensorID = next(iter(compensated))
+    csvFile = tmp_path / 'export' / ('sensor' + str(sensorID) + '_type0a.csv')
+    with open(csvFile, newline='', encoding='utf-8') as fileObj:
+        temperatures = [float(row['temperature']) for row in csv.DictReader(fileObj)]
+    assert numpy.allclose(temperatures, compensated[sensorID].temperature, atol=1e-6)
+
+    exported = cast(List[str], results['export'])
+    Path(exported[0]).unlink()
+    graph.run()
+    assert graph.lastRun == ['export']
+    assert Path(exported[0]).exists()
+
+
+def test_pipelinesShareCacheDir(tmp_path: Path) -> None:
+    """Test if pipelines for different logs can share a cache directory without removing each other's outputs."""
+    logFiles = (Path(LOG_FILE), _imuLog(tmp_path))
+    for run in range(2):
+        for number, logFile in enumerate(logFiles):
+            graph = pipeline.flightPipeline(logFile, tmp_path / ('export' + str(number)), cacheDir=tmp_path / 'cache')
+            graph.run()
+            assert bool(graph.lastRun) == (not run)
+    assert len(list((tmp_path / 'cache').glob('decode-*.pickle'))) == 2
+
+
+def test_exportChunkingDoesNotChangeFiles(tmp_path: Path) -> None:
+    """Test if writing the export a piece at a time gives the same files as writing it in one go."""
+    graph = pipeline.flightPipeline(_imuLog(tmp_path), tmp_path / 'whole')
+    stage = graph.stages['export']
+    results = graph.run(stage.inputs)
+    stageOutputs = [results[name] for name in stage.inputs]
+    whole = cast(List[str], stage.function(*stageOutputs, tmp_path / 'whole', chunkPackets=1 << 30))
+    chunked = cast(List[str], stage.function(*stageOutputs, tmp_path / 'chunked', chunkPackets=77))
+    assert [Path(path).name for path in chunked] == [Path(path).name for path in whole]
+    for wholePath, chunkedPath in zip(whole, chunked):
+        assert Path(chunkedPath).read_bytes() == Path(wholePath).read_bytes()
@@ -0,0 +1,65 @@
+"""Unit Tests for seekableLog.py."""
+# pylint: disable=invalid-name
+import gzip
+from pathlib import Path
+
+import numpy
+
+from CalibrationCode import dataExtraction, seekableLog
+
+LOG_FILE = Path('Test Logs/easRV12_28_Oct_2016_04_39_20.log')
+
+
+def _packetList(batches: list) -> list:
+    """Flatten batches into a list of (index, ID, type), sorted by index."""
+    packets = [(int(packet['index']), int(packet['ID']), int(packet['type']))
+               for batch in batches for packetArray in batch.values() for packet in packetArray]
+    return sorted(packets)
+
+
+def test_seekableLogDecompresses(tmp_path: Path) -> None:
+    """Test if a seekable log is a valid gzip file of the original log, with a sane frame index."""
+    seekableFile = tmp_path / 'log.gz'
+    seekableLog.writeSeekableLog(LOG_FILE, seekableFile, framePackets=500)
+    assert gzip.decompress(seekableFile.read_bytes()) == LOG_FILE.read_bytes()
+
+    index = seekableLog.readFrameIndex(seekableFile)
+    assert index is not None
+    frames = list(index)
+    assert not frames[0].offset
+    assert not frames[0].packetCount
+    nextPacket = 0
+    for previous, frame in zip(frames, frames[1:]):
+        assert frame.offset == previous.offset + previous.size
+        assert frame.firstPacket == nextPacket
+        nextPacket += frame.packetCount
+    assert frames[-1].offset + frames[-1].size == seekableFile.stat().st_size
+    assert seekableLog.readFrameIndex(LOG_FILE) is None
+
+
+def test_queryLogWorks(tmp_path: Path) -> None:
+    """Test if seekable and plain logs give the same query results as filtering the full decode."""
+    seekableFile = tmp_path / 'log.gz'
+    seekableLog.writeSeekableLog(LOG_FILE, seekableFile, framePackets=500)
+    _, batches = dataExtraction.openFileStreaming(LOG_FILE)
+    everything = _packetList(list(batches))
+
+    for startPacket, stopPacket, sensorIDs in ((0, None, None), (1000, 3000, None), (700, 4100, [2]), (0, None, [4])):
+        expected = [packet for packet in everything
+                    if packet[0] >= startPacket and (stopPacket is None or packet[0] < stopPacket)
+                    and (sensorIDs is None or packet[1] in sensorIDs)]
+        for file in (LOG_FILE, seekableFile):
+            _, queried = seekableLog.queryLog(file, startPacket, stopPacket, sensorIDs, chunkPackets=300)
+            assert _packetList(list(queried)) == expected
+
+
+def test_frameSensorMask() -> None:
+    """Test if frames are only marked as holding the sensors they hold."""
+    _, batches = dataExtraction.openFileStreaming(LOG_FILE)
+    mask = seekableLog._sensorMask(next(batches))   # pylint: disable=protected-access
+    frame = seekableLog.LogFrame(0, 0, 0, 0, mask)
+    present = numpy.flatnonzero(numpy.unpackbits(numpy.frombuffer(mask, dtype=numpy.uint8), bitorder='little'))
+    assert present.tolist() == [2, 3, 4]
+    assert frame.hasSensor(2)
+    assert not frame.hasSensor(7)
+    assert frame.hasSensor(1000)